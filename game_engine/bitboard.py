@@ -0,0 +1,73 @@
+"""
+bitboard.py
+
+Bitboard helpers for Blokus. The 20x20 board is packed into a single
+400-bit Python int, where bit (r * BOARD_SIZE + c) stands for cell (r, c).
+Python ints are arbitrary precision, so one int plays the role of the
+seven uint64 words a C engine would use, and every AND/OR/shift works
+on the whole board at once.
+
+Provides:
+- shape_mask(shape_coords, row_off, col_off) to build a placement mask
+- edge_neighbors(mask) to dilate a mask
+- ORIENTATION_MASKS, every in-bounds placement mask of every orientation,
+  precomputed at import time
+"""
+
+from typing import Iterable, List, Tuple
+from .board import BOARD_SIZE
+from .pieces import ALL_ORIENTATIONS
+
+BOARD_CELLS = BOARD_SIZE * BOARD_SIZE
+FULL_MASK = (1 << BOARD_CELLS) - 1
+
+# Masks used to stop horizontal shifts from wrapping onto the next row
+FIRST_COL_MASK = sum(1 << (r * BOARD_SIZE) for r in range(BOARD_SIZE))
+LAST_COL_MASK = FIRST_COL_MASK << (BOARD_SIZE - 1)
+NOT_FIRST_COL = FULL_MASK ^ FIRST_COL_MASK
+NOT_LAST_COL = FULL_MASK ^ LAST_COL_MASK
+
+
+def cell_bit(r: int, c: int) -> int:
+    """
+    Bit for the single cell (r, c).
+    """
+    return 1 << (r * BOARD_SIZE + c)
+
+
+def shape_mask(shape_coords: Iterable[Tuple[int, int]], row_off: int = 0, col_off: int = 0) -> int:
+    """
+    Mask of the squares covered by shape_coords shifted by (row_off, col_off).
+    The caller is responsible for keeping the shifted squares on the board.
+    """
+    mask = 0
+    for (r, c) in shape_coords:
+        mask |= cell_bit(r + row_off, c + col_off)
+    return mask
+
+
+def edge_neighbors(mask: int) -> int:
+    """
+    Cells that share an edge with at least one set cell of mask.
+    """
+    right = (mask & NOT_LAST_COL) << 1
+    left = (mask & NOT_FIRST_COL) >> 1
+    down = mask << BOARD_SIZE
+    up = mask >> BOARD_SIZE
+    return (right | left | down | up) & FULL_MASK
+
+
+# ORIENTATION_MASKS[piece_id][orient_idx] lines up with ALL_ORIENTATIONS[piece_id][orient_idx]
+# and holds a (row_off, col_off, mask) triple for every shift that keeps the piece on the board.
+ORIENTATION_MASKS: List[List[List[Tuple[int, int, int]]]] = []
+for _orientations in ALL_ORIENTATIONS:
+    _piece_masks = []
+    for _coords, _max_r, _max_c, _ in _orientations:
+        _base = shape_mask(_coords)
+        _piece_masks.append([
+            (_row_off, _col_off, _base << (_row_off * BOARD_SIZE + _col_off))
+            for _row_off in range(BOARD_SIZE - _max_r)
+            for _col_off in range(BOARD_SIZE - _max_c)
+        ])
+    ORIENTATION_MASKS.append(_piece_masks)
+del _orientations, _piece_masks, _coords, _max_r, _max_c, _base
@@ -8,26 +8,77 @@ Defines the BoardState class for Blokus, including:
 """
 
 from typing import List, Optional
-import copy
+import random
+import numpy as np
 
 NUM_PLAYERS = 4
 BOARD_SIZE = 20
+NUM_PIECES = 21
+
+# pieces_remaining mask with all 21 pieces still in hand
+ALL_PIECES_MASK = (1 << NUM_PIECES) - 1
+
+# Value stored in board_grid for an empty cell (colors are 0..3)
+EMPTY = 255
+# Value stored in the 1-cell border of board_pad (outside the 20x20 board)
+OFF_BOARD = 254
+
+# Starting corner of each color; its first piece must cover it
+CORNER_POSITIONS = [(0,0), (0,BOARD_SIZE-1), (BOARD_SIZE-1,0), (BOARD_SIZE-1, BOARD_SIZE-1)]
+
+# Zobrist keys: random 64-bit ints XOR-ed into BoardState.zobrist for every occupied
+# (color, r, c) cell, every placed (color, piece_id) and the player to move, so that
+# equal positions reached by different move orders get the same hash.
+_zobrist_rng = random.Random(0x5EED)
+ZOBRIST_CELL = [[[_zobrist_rng.getrandbits(64) for _ in range(BOARD_SIZE)] for _ in range(BOARD_SIZE)]
+                for _ in range(NUM_PLAYERS)]
+ZOBRIST_PIECE = [[_zobrist_rng.getrandbits(64) for _ in range(NUM_PIECES)] for _ in range(NUM_PLAYERS)]
+ZOBRIST_PLAYER = [_zobrist_rng.getrandbits(64) for _ in range(NUM_PLAYERS)]
+del _zobrist_rng
+
+def piece_ids(mask: int) -> List[int]:
+    """
+    The piece_ids whose bit is set in a pieces_remaining mask, in increasing order.
+    """
+    return [pid for pid in range(NUM_PIECES) if mask >> pid & 1]
 
 class BoardState:
     """
     Stores the state of the Blokus board:
-      - board_grid[r][c] = None if empty, or an integer (0..3) indicating which color occupies that cell.
-      - pieces_remaining[color] = set of piece_ids (0..20) that that color has not placed yet
+      - board_grid[r, c] = EMPTY (255) if empty, or an integer (0..3) indicating which color occupies that cell.
+        Stored as a single uint8 NumPy array of shape (20, 20).
+      - board_pad = the same grid with a 1-cell OFF_BOARD border, shape (22, 22).
+        board_grid is a view into its interior, so the two always agree.
+      - occupied_any / occupied_color[color] = the same occupancy as 400-bit bitboards
+        (see bitboard.py), bit r*20+c set if cell (r, c) is taken (by that color).
+      - anchors[color] = set of empty (r, c) cells a new piece of that color may cover to
+        satisfy the corner rule: diagonal to own color and not edge-adjacent to it
+        (just the color's starting corner before its first move)
+      - pieces_remaining[color] = 21-bit int mask, bit piece_id set while that color has not
+        placed that piece yet (piece_ids(mask) lists them)
       - current_player = integer in [0..3]
       - moves_made[color] = how many moves the color has made (used to check if corner placement is still required)
+      - zobrist = 64-bit hash of the occupied cells, placed pieces and player to move,
+        kept up to date by apply_move (see ZOBRIST_CELL / ZOBRIST_PIECE / ZOBRIST_PLAYER)
     """
 
     def __init__(self):
-        # 20x20 board, each cell is None if empty, else an integer 0..3
-        self.board_grid = [[None for _ in range(BOARD_SIZE)] for _ in range(BOARD_SIZE)]
+        # 22x22 padded board; the border lets neighbor probes skip bounds checks
+        self.board_pad = np.full((BOARD_SIZE + 2, BOARD_SIZE + 2), OFF_BOARD, dtype=np.uint8)
+        self.board_pad[1:-1, 1:-1] = EMPTY
+
+        # 20x20 board, each cell is EMPTY if empty, else an integer 0..3
+        self.board_grid = self.board_pad[1:-1, 1:-1]
+
+        # Bitboards of occupied cells: all colors together, and one per color
+        self.occupied_any = 0
+        self.occupied_color = [0]*NUM_PLAYERS
+
+        # Anchor cells per color, kept up to date by apply_move
+        self.anchors = [{CORNER_POSITIONS[c]} for c in range(NUM_PLAYERS)]
 
         # For each color, we track which pieces remain. Each color has 21 unique piece_ids: 0..20
-        self.pieces_remaining = [set(range(21)) for _ in range(NUM_PLAYERS)]
+        self.pieces_remaining = [ALL_PIECES_MASK]*NUM_PLAYERS
 
         # Start with player 0
         self.current_player = 0
@@ -39,14 +90,35 @@ class BoardState:
         # If it reaches 4 in a row, the game ends
         self.consecutive_passes = 0
 
+        # Hash of the empty board with player 0 to move
+        self.zobrist = ZOBRIST_PLAYER[0]
+
     def clone(self):
         """
-        Create a deep copy of the current board state.
+        Create an independent copy of the current board state.
+        The grid is a flat uint8 array, so a plain ndarray copy is enough;
+        the per-color anchor sets are copied and the rest are plain ints.
         """
-        new_state = BoardState()
-        new_state.board_grid = copy.deepcopy(self.board_grid)
-        new_state.pieces_remaining = [s.copy() for s in self.pieces_remaining]
+        new_state = BoardState.__new__(BoardState)
+        new_state.board_pad = self.board_pad.copy()
+        new_state.board_grid = new_state.board_pad[1:-1, 1:-1]
+        new_state.occupied_any = self.occupied_any
+        new_state.occupied_color = self.occupied_color[:]
+        new_state.anchors = [a.copy() for a in self.anchors]
+        new_state.pieces_remaining = self.pieces_remaining[:]
         new_state.current_player = self.current_player
         new_state.moves_made = self.moves_made[:]
         new_state.consecutive_passes = self.consecutive_passes
+        new_state.zobrist = self.zobrist
         return new_state
+
+    def __getstate__(self):
+        # board_grid is a view of board_pad; pickling / deepcopy would turn it into
+        # a separate array, so it is left out and rebuilt from board_pad
+        state = self.__dict__.copy()
+        del state['board_grid']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.board_grid = self.board_pad[1:-1, 1:-1]
@@ -0,0 +1,110 @@
+"""
+kernels.py
+
+Integer kernels for the Blokus rules, compiled with Numba when it is
+installed. They work directly on BoardState.board_pad (the 22x22 uint8
+grid with an OFF_BOARD border) so neighbor probes need no bounds checks.
+
+Numba is optional: without it the same functions run as plain Python,
+and HAVE_NUMBA lets callers pick a faster pure-Python path instead.
+"""
+
+import numpy as np
+from .board import BOARD_SIZE, EMPTY
+from .pieces import ALL_ORIENTATIONS
+
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+
+    def njit(*args, **kwargs):
+        """
+        Stand-in for numba.njit that leaves the function as plain Python.
+        """
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
+
+# Per-piece orientation tables in the array form the kernels expect:
+#  - PIECE_ORIENT_SQUARES[piece_id]: int8 [n_orientations, n_squares, 2] of (r, c) squares
+#  - PIECE_ORIENT_BOUNDS[piece_id]:  int8 [n_orientations, 2] of (max_r, max_c)
+# Orientation k lines up with ALL_ORIENTATIONS[piece_id][k].
+PIECE_ORIENT_SQUARES = [
+    np.stack([coords_arr for (_, _, _, coords_arr) in orientations])
+    for orientations in ALL_ORIENTATIONS
+]
+PIECE_ORIENT_BOUNDS = [
+    np.array([(max_r, max_c) for (_, max_r, max_c, _) in orientations], dtype=np.int8)
+    for orientations in ALL_ORIENTATIONS
+]
+
+
+@njit(cache=True, boundscheck=False)
+def _check_legal_move_fast(board, orient_r, orient_c, row_off, col_off,
+                           color, first_move, corner_r, corner_c):
+    """
+    Rules 2-5 of rules.check_legal_move for one in-bounds placement.
+    board is the padded board, so every board index below is shifted by +1.
+    orient_r / orient_c hold the orientation's square coordinates.
+    """
+    corner_contact = False
+    for i in range(orient_r.shape[0]):
+        rr = orient_r[i] + row_off + 1
+        cc = orient_c[i] + col_off + 1
+        # not already occupied
+        if board[rr, cc] != EMPTY:
+            return False
+        if first_move:
+            # must cover the color's starting corner
+            if rr == corner_r + 1 and cc == corner_c + 1:
+                corner_contact = True
+            continue
+        # no edge contact with own color
+        if (board[rr - 1, cc] == color or board[rr + 1, cc] == color
+                or board[rr, cc - 1] == color or board[rr, cc + 1] == color):
+            return False
+        # at least one corner contact with own color
+        if (board[rr - 1, cc - 1] == color or board[rr - 1, cc + 1] == color
+                or board[rr + 1, cc - 1] == color or board[rr + 1, cc + 1] == color):
+            corner_contact = True
+    return corner_contact
+
+
+@njit(cache=True, boundscheck=False)
+def _enumerate_placements_for_piece(board, orient_squares, orient_bounds, anchors,
+                                    color, first_move, corner_r, corner_c):
+    """
+    Find every legal placement of one piece. Only shifts that put some
+    square of an orientation on one of the anchors[:, (r, c)] cells are tried,
+    since every legal placement covers an anchor.
+    Returns an int16 array [n_legal, 3] of (orientation_index, row_off, col_off).
+    """
+    n_orient = orient_squares.shape[0]
+    n_squares = orient_squares.shape[1]
+    # a placement covering several anchors is reached once per anchor
+    seen = np.zeros((n_orient, BOARD_SIZE, BOARD_SIZE), dtype=np.bool_)
+    out = np.empty((n_orient * BOARD_SIZE * BOARD_SIZE, 3), dtype=np.int16)
+    n = 0
+    for a in range(anchors.shape[0]):
+        for k in range(n_orient):
+            orient_r = orient_squares[k, :, 0]
+            orient_c = orient_squares[k, :, 1]
+            for i in range(n_squares):
+                row_off = anchors[a, 0] - orient_r[i]
+                col_off = anchors[a, 1] - orient_c[i]
+                if (row_off < 0 or col_off < 0
+                        or row_off + orient_bounds[k, 0] >= BOARD_SIZE
+                        or col_off + orient_bounds[k, 1] >= BOARD_SIZE
+                        or seen[k, row_off, col_off]):
+                    continue
+                seen[k, row_off, col_off] = True
+                if _check_legal_move_fast(board, orient_r, orient_c, row_off, col_off,
+                                          color, first_move, corner_r, corner_c):
+                    out[n, 0] = k
+                    out[n, 1] = row_off
+                    out[n, 2] = col_off
+                    n += 1
+    return out[:n]
@@ -6,9 +6,14 @@ each as a set of (row, col) offsets in a canonical orientation.
 
 Provides a function get_all_orientations(piece_shape) that
 returns all unique orientations (rotations + flips).
+
+ALL_ORIENTATIONS[piece_id] holds those orientations precomputed once at
+import time, together with their bounding boxes.
 """
 
-from typing import Set, Tuple, List
+from functools import lru_cache
+from typing import FrozenSet, Set, Tuple, List
+import numpy as np
 
 # Each piece is defined as a set of (row, col) tuples.
 # We will define them so that (0,0) is included and the shape
@@ -46,11 +51,21 @@ def flip_horizontal(shape: Set[Tuple[int, int]]) -> Set[Tuple[int, int]]:
     flipped = {(r, -c) for (r, c) in shape}
     return normalize_shape(flipped)
 
-def get_all_orientations(shape: Set[Tuple[int, int]]) -> List[Set[Tuple[int, int]]]:
+def get_all_orientations(shape: Set[Tuple[int, int]]) -> List[FrozenSet[Tuple[int, int]]]:
     """
     Return a list of all unique orientations (rotations + flips)
     of the given shape. Each orientation is normalized so that
     the top-left corner is (0,0).
+
+    Results are memoized per shape (see _orientations_of), so the
+    orientations are returned as frozensets that callers cannot mutate.
+    """
+    return list(_orientations_of(frozenset(shape)))
+
+@lru_cache(maxsize=None)
+def _orientations_of(shape: FrozenSet[Tuple[int, int]]) -> Tuple[FrozenSet[Tuple[int, int]], ...]:
+    """
+    Cached worker for get_all_orientations, keyed on the frozen shape.
     """
     # We'll generate:
     #  - 4 rotations
@@ -69,11 +84,7 @@ def get_all_orientations(shape: Set[Tuple[int, int]]) -> List[Set[Tuple[int, int
         flipped = flip_horizontal(current)
         orientations.add(frozenset(flipped))
 
-    # Convert from frozenset back to set
-    result = []
-    for item in orientations:
-        result.append(set(item))
-    return result
+    return tuple(orientations)
 
 # Now define all 21 shapes in canonical form, each as a set of (r, c).
 # We'll store them in a list where index = piece_id.
@@ -137,3 +148,23 @@ ALL_SHAPES.append({(0,0),(0,1),(1,1),(1,2),(2,2)})
 
 # Now each piece_id in [0..20] has a canonical shape in ALL_SHAPES.
 # We'll rely on get_all_orientations() to get all possible transformations.
+
+# Precompute every orientation of every piece once, so move generation
+# never has to rebuild them. ALL_ORIENTATIONS[piece_id] is a list of
+# (coords, max_r, max_c, coords_arr) where:
+#  - coords is a sorted tuple of (r, c) squares
+#  - max_r / max_c give the bounding box (min is always 0,0)
+#  - coords_arr is the same squares as an int8 array of shape [n_squares, 2]
+ALL_ORIENTATIONS = []
+for _shape in ALL_SHAPES:
+    _entries = []
+    for _orientation in get_all_orientations(_shape):
+        _coords = tuple(sorted(_orientation))
+        _entries.append((
+            _coords,
+            max(r for r, _ in _coords),
+            max(c for _, c in _coords),
+            np.array(_coords, dtype=np.int8),
+        ))
+    ALL_ORIENTATIONS.append(_entries)
+del _shape, _entries, _orientation, _coords
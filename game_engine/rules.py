@@ -3,20 +3,42 @@ rules.py
 
 Contains functions to:
 - Generate all legal moves for a given BoardState and player
-- Apply a move (place a piece) onto the board
+- Apply a move (place a piece) onto the board, either on a copy or in place with undo
 - Check terminal condition (4 consecutive passes or all pieces placed)
 """
 
-from typing import List, Tuple, Optional, Set
-from .board import BoardState, BOARD_SIZE
-from .pieces import ALL_SHAPES, get_all_orientations, normalize_shape
-
-Move = Tuple[int, int, int, Set[Tuple[int, int]]] 
+from dataclasses import dataclass, field
+from typing import List, Tuple, Optional
+import numpy as np
+from .board import (BoardState, BOARD_SIZE, EMPTY, CORNER_POSITIONS, ZOBRIST_CELL, ZOBRIST_PIECE,
+                    ZOBRIST_PLAYER, piece_ids)
+from .pieces import ALL_ORIENTATIONS
+from .bitboard import ORIENTATION_MASKS, cell_bit, shape_mask, edge_neighbors
+from .kernels import (HAVE_NUMBA, PIECE_ORIENT_SQUARES, PIECE_ORIENT_BOUNDS,
+                      _check_legal_move_fast, _enumerate_placements_for_piece)
+
+Move = Tuple[int, int, int, Tuple[Tuple[int, int], ...]]
 # We'll define a Move as (piece_id, row_offset, col_offset, shape_coords)
-# where shape_coords is the chosen orientation's squares,
+# where shape_coords is the chosen orientation's squares (a sorted tuple from ALL_ORIENTATIONS),
 # and (row_offset, col_offset) is how we shift them onto the board.
 
-CORNER_POSITIONS = [(0,0), (0,BOARD_SIZE-1), (BOARD_SIZE-1,0), (BOARD_SIZE-1, BOARD_SIZE-1)]
+# Neighbor directions
+EDGE_NEIGHBORS = [(0,1),(0,-1),(1,0),(-1,0)]
+CORNER_NEIGHBORS = [(1,1),(1,-1),(-1,1),(-1,-1)]
+
+# ANCHOR_PLACEMENTS[r][c][piece_id] lists a (move, mask) pair for every in-bounds placement
+# of that piece that covers cell (r, c). Putting one square of an orientation on an anchor
+# fixes the shift of the whole orientation, so the absolute squares and the mask of each
+# candidate only depend on the board geometry and are worked out once here.
+ANCHOR_PLACEMENTS = [[[[] for _ in ALL_ORIENTATIONS] for _ in range(BOARD_SIZE)]
+                     for _ in range(BOARD_SIZE)]
+for _piece_id, (_orientations, _masks) in enumerate(zip(ALL_ORIENTATIONS, ORIENTATION_MASKS)):
+    for (_coords, _, _, _), _placements in zip(_orientations, _masks):
+        for _row_off, _col_off, _mask in _placements:
+            _candidate = ((_piece_id, _row_off, _col_off, _coords), _mask)
+            for (_r, _c) in _coords:
+                ANCHOR_PLACEMENTS[_r + _row_off][_c + _col_off][_piece_id].append(_candidate)
+del _piece_id, _orientations, _masks, _coords, _placements, _row_off, _col_off, _mask, _candidate, _r, _c
 
 def check_legal_move(state: BoardState, move: Move) -> bool:
     """
@@ -31,137 +53,216 @@ def check_legal_move(state: BoardState, move: Move) -> bool:
     color = state.current_player
 
     # 1) piece must be available
-    if piece_id not in state.pieces_remaining[color]:
+    if not state.pieces_remaining[color] >> piece_id & 1:
         return False
 
-    # We'll gather the absolute board squares
-    placed_squares = []
+    # 3) within board check
     for (r, c) in shape_coords:
-        rr = r + row_off
-        cc = c + col_off
-        # 3) within board check
-        if not (0 <= rr < BOARD_SIZE and 0 <= cc < BOARD_SIZE):
-            return False
-        # not already occupied
-        if state.board_grid[rr][cc] is not None:
+        if not (0 <= r + row_off < BOARD_SIZE and 0 <= c + col_off < BOARD_SIZE):
             return False
-        placed_squares.append((rr, cc))
-
-    # If it's the first move for this color, we must cover the color's corner
-    # Let's define corner index = color for simplicity:
-    if state.moves_made[color] == 0:
-        corner_r, corner_c = CORNER_POSITIONS[color]
-        # Check if (corner_r, corner_c) is in placed_squares
-        if (corner_r, corner_c) not in placed_squares:
-            return False
-        # If the first move passes these checks, it's legal.
-        return True
 
-    # After first move, we must:
-    # (a) Not share an edge with same color squares
-    # (b) Must share at least a corner with same color squares
+    shape_arr = np.asarray(shape_coords, dtype=np.int8)
+    corner_r, corner_c = CORNER_POSITIONS[color]
+    return bool(_check_legal_move_fast(state.board_pad, shape_arr[:, 0], shape_arr[:, 1],
+                                       row_off, col_off, color, state.moves_made[color] == 0,
+                                       corner_r, corner_c))
 
-    # We'll track adjacency
-    corner_contact = False
 
-    # Directions for edge adjacency
-    edge_neighbors = [(0,1),(0,-1),(1,0),(-1,0)]
-    # Directions for corner adjacency
-    corner_neighbors = [(1,1),(1,-1),(-1,1),(-1,-1)]
-
-    # We'll convert placed squares to a set for quick lookup
-    placed_set = set(placed_squares)
-
-    for (rr, cc) in placed_squares:
-        # Check all neighbors
-        for dr, dc in edge_neighbors:
-            nr, nc = rr+dr, cc+dc
-            if 0 <= nr < BOARD_SIZE and 0 <= nc < BOARD_SIZE:
-                if state.board_grid[nr][nc] == color:
-                    # if same color is on an edge, illegal
-                    return False
+def get_legal_moves(state: BoardState) -> List[Move]:
+    """
+    Enumerate all possible moves for state.current_player.
+    If none are found, returning an empty list indicates a pass.
+    """
+    if HAVE_NUMBA:
+        return _get_legal_moves_jit(state)
+    return _get_legal_moves_from_anchors(state)
 
-        for dr, dc in corner_neighbors:
-            nr, nc = rr+dr, cc+dc
-            if 0 <= nr < BOARD_SIZE and 0 <= nc < BOARD_SIZE:
-                if state.board_grid[nr][nc] == color:
-                    corner_contact = True
 
-    if not corner_contact:
-        # Must share at least one corner with same color
-        return False
+def _get_legal_moves_jit(state: BoardState) -> List[Move]:
+    """
+    get_legal_moves via the compiled per-piece kernel, which tries every
+    shift that puts an orientation on one of the color's anchor cells.
+    """
+    color = state.current_player
+    legal_moves = []
+    if not state.anchors[color]:
+        return legal_moves
+    anchors = np.array(sorted(state.anchors[color]), dtype=np.int64)
+    first_move = state.moves_made[color] == 0
+    corner_r, corner_c = CORNER_POSITIONS[color]
+
+    for piece_id in piece_ids(state.pieces_remaining[color]):
+        placements = _enumerate_placements_for_piece(
+            state.board_pad, PIECE_ORIENT_SQUARES[piece_id], PIECE_ORIENT_BOUNDS[piece_id], anchors,
+            color, first_move, corner_r, corner_c)
+        orientations = ALL_ORIENTATIONS[piece_id]
+        for orient_idx, row_off, col_off in placements.tolist():
+            legal_moves.append((piece_id, row_off, col_off, orientations[orient_idx][0]))
 
-    return True
+    return legal_moves
 
 
-def get_legal_moves(state: BoardState) -> List[Move]:
+def _get_legal_moves_from_anchors(state: BoardState) -> List[Move]:
     """
-    Enumerate all possible moves for state.current_player.
-    If none are found, returning an empty list indicates a pass.
+    Pure-Python get_legal_moves, used when Numba is not installed.
     """
     color = state.current_player
     legal_moves = []
 
+    # Every legal piece must cover one of the color's anchor cells, so instead of
+    # trying every shift on the board we only try shifts that put some square
+    # of the piece on an anchor.
+    anchors = state.anchors[color]
+    if not anchors:
+        return legal_moves
+    blocked = state.occupied_any | edge_neighbors(state.occupied_color[color])
+
     # The pieces that color still has
-    available_pieces = state.pieces_remaining[color]
+    available_pieces = piece_ids(state.pieces_remaining[color])
 
     for piece_id in available_pieces:
-        shape = ALL_SHAPES[piece_id]
-        # Get all orientations
-        orientations = get_all_orientations(shape)
-
-        for orientation in orientations:
-            # orientation is a set of (r, c)
-            # We'll attempt to place its top-left corner all over the board
-            # but we have to consider all possible row_off/col_off shifts
-            # that keep squares in [0..19].
-            # Actually, we won't do a naive approach of 20x20 per orientation, 
-            # because we have to still check legality anyway. That’s fine for now.
-
-            # Just to be consistent, orientation is normalized so min row,col = 0,0
-            # So the bounding box of orientation is something:
-            max_r = max(r for r, c in orientation)
-            max_c = max(c for r, c in orientation)
-
-            # The shift that puts (0,0) at (row_off, col_off)
-            # must keep (max_r, max_c) within board.
-            for row_off in range(BOARD_SIZE - max_r):
-                for col_off in range(BOARD_SIZE - max_c):
-                    move_candidate = (piece_id, row_off, col_off, orientation)
-                    if check_legal_move(state, move_candidate):
-                        legal_moves.append(move_candidate)
+        # A placement covering several anchors is reached once per anchor
+        seen = set()
+        for (ar, ac) in anchors:
+            for move, mask in ANCHOR_PLACEMENTS[ar][ac][piece_id]:
+                if mask & blocked or mask in seen:
+                    continue
+                seen.add(mask)
+                legal_moves.append(move)
 
     return legal_moves
 
 
+@dataclass
+class UndoToken:
+    """
+    Everything undo_move needs to revert one apply_move_inplace call.
+    piece_id is None for a pass; the other placement fields are then unused.
+    """
+    color: int
+    prior_consecutive_passes: int
+    prior_zobrist: int
+    piece_id: Optional[int] = None
+    placed_cells: List[Tuple[int, int]] = field(default_factory=list)
+    mask: int = 0
+    anchors_removed: List[Tuple[int, Tuple[int, int]]] = field(default_factory=list)
+    anchors_added: List[Tuple[int, int]] = field(default_factory=list)
+
+
 def apply_move(state: BoardState, move: Optional[Move]) -> BoardState:
     """
     Returns a new BoardState after applying the given move.
     If move is None, it means pass.
     """
     new_state = state.clone()
-    color = new_state.current_player
+    apply_move_inplace(new_state, move)
+    return new_state
+
+
+def apply_move_inplace(state: BoardState, move: Optional[Move]) -> UndoToken:
+    """
+    Apply the given move (None = pass) directly to state, without cloning.
+    Returns an UndoToken that undo_move can use to restore the previous state.
+    """
+    color = state.current_player
+    token = UndoToken(color=color, prior_consecutive_passes=state.consecutive_passes,
+                      prior_zobrist=state.zobrist)
+    next_player = (color + 1) % 4
+    zobrist = state.zobrist ^ ZOBRIST_PLAYER[color] ^ ZOBRIST_PLAYER[next_player]
 
     if move is None:
         # pass
-        new_state.consecutive_passes += 1
+        state.consecutive_passes += 1
     else:
         # place piece
         piece_id, row_off, col_off, shape_coords = move
-        new_state.pieces_remaining[color].remove(piece_id)
+        state.pieces_remaining[color] &= ~(1 << piece_id)
+
+        placed = [(r + row_off, c + col_off) for (r, c) in shape_coords]
+        cell_keys = ZOBRIST_CELL[color]
+        zobrist ^= ZOBRIST_PIECE[color][piece_id]
+        for (rr, cc) in placed:
+            state.board_grid[rr, cc] = color
+            zobrist ^= cell_keys[rr][cc]
+
+        mask = shape_mask(shape_coords, row_off, col_off)
+        state.occupied_any |= mask
+        state.occupied_color[color] |= mask
 
-        for (r, c) in shape_coords:
-            rr = r + row_off
-            cc = c + col_off
-            new_state.board_grid[rr][cc] = color
+        token.piece_id = piece_id
+        token.placed_cells = placed
+        token.mask = mask
+        _update_anchors(state, color, placed, token)
 
-        new_state.moves_made[color] += 1
-        new_state.consecutive_passes = 0
+        state.moves_made[color] += 1
+        state.consecutive_passes = 0
 
     # Switch to next player
-    new_state.current_player = (color + 1) % 4
+    state.current_player = next_player
+    state.zobrist = zobrist
 
-    return new_state
+    return token
+
+
+def undo_move(state: BoardState, token: UndoToken):
+    """
+    Revert the apply_move_inplace call that produced token.
+    Moves must be undone in the reverse order they were applied.
+    """
+    color = token.color
+    state.current_player = color
+    state.consecutive_passes = token.prior_consecutive_passes
+    state.zobrist = token.prior_zobrist
+
+    if token.piece_id is None:
+        return
+
+    state.pieces_remaining[color] |= 1 << token.piece_id
+    for (rr, cc) in token.placed_cells:
+        state.board_grid[rr, cc] = EMPTY
+    state.occupied_any &= ~token.mask
+    state.occupied_color[color] &= ~token.mask
+
+    own_anchors = state.anchors[color]
+    own_anchors.difference_update(token.anchors_added)
+    for anchor_color, cell in token.anchors_removed:
+        state.anchors[anchor_color].add(cell)
+
+    state.moves_made[color] -= 1
+
+
+def _update_anchors(state: BoardState, color: int, placed: List[Tuple[int, int]], token: UndoToken):
+    """
+    Incrementally update state.anchors after color covered the placed cells.
+    Expects board_grid and the bitboards to already include the new piece.
+    Every change is recorded on token so undo_move can revert it.
+    """
+    own_anchors = state.anchors[color]
+
+    # Newly covered cells are no longer anchors for anyone
+    for anchor_color, anchors in enumerate(state.anchors):
+        for cell in placed:
+            if cell in anchors:
+                anchors.remove(cell)
+                token.anchors_removed.append((anchor_color, cell))
+
+    # Cells edge-adjacent to the new piece can no longer be used by this color
+    for (rr, cc) in placed:
+        for dr, dc in EDGE_NEIGHBORS:
+            cell = (rr+dr, cc+dc)
+            if cell in own_anchors:
+                own_anchors.remove(cell)
+                token.anchors_removed.append((color, cell))
+
+    # Empty diagonal neighbors become anchors unless they touch own color by an edge
+    blocked = state.occupied_any | edge_neighbors(state.occupied_color[color])
+    for (rr, cc) in placed:
+        for dr, dc in CORNER_NEIGHBORS:
+            nr, nc = rr+dr, cc+dc
+            if (0 <= nr < BOARD_SIZE and 0 <= nc < BOARD_SIZE and not cell_bit(nr, nc) & blocked
+                    and (nr, nc) not in own_anchors):
+                own_anchors.add((nr, nc))
+                token.anchors_added.append((nr, nc))
 
 
 def is_terminal(state: BoardState) -> bool:
@@ -175,8 +276,5 @@ def is_terminal(state: BoardState) -> bool:
         return True
 
     # Check if any player still has any piece
-    # If all sets are empty, game ends
-    for color in range(4):
-        if len(state.pieces_remaining[color]) > 0:
-            return False
-    return True
+    # If all masks are empty, game ends
+    return not any(state.pieces_remaining)
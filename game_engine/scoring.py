@@ -6,7 +6,11 @@ Basic approach: Count squares left in each player's hand.
 Optionally handle advanced scoring (+15 if placed all, +5 if last piece was monomino).
 """
 
-from .board import BoardState, BOARD_SIZE
+from .board import BoardState, BOARD_SIZE, piece_ids
+from .pieces import ALL_SHAPES
+
+# Mapping piece_id -> number_of_squares, taken from the shape length
+_PIECE_SIZE = tuple(len(shape) for shape in ALL_SHAPES)
 
 def compute_final_scores(state: BoardState) -> list:
     """
@@ -22,15 +26,7 @@ def compute_final_scores(state: BoardState) -> list:
     """
     scores = [0, 0, 0, 0]
     # We do not actually track how many squares each piece had in this minimal version,
-    # so let's approximate: The piece_id correlates to the shape. We can count squares from the piece shape.
-
-    # Mapping piece_id -> number_of_squares
-    # This is rough: we can get it from the shape length.
-    from .pieces import ALL_SHAPES
-
+    # so we look each remaining piece_id up in _PIECE_SIZE.
     for color in range(4):
-        leftover_squares = 0
-        for pid in state.pieces_remaining[color]:
-            leftover_squares += len(ALL_SHAPES[pid])
-        scores[color] = -leftover_squares  # each leftover square is -1
+        scores[color] = -sum(_PIECE_SIZE[pid] for pid in piece_ids(state.pieces_remaining[color]))  # each leftover square is -1
     return scores
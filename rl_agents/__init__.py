@@ -1,14 +1,24 @@
 # rl_agents/__init__.py
 
-from rl_agents.networks import AlphaBlokusNet
-from rl_agents.policy_wrapper import encode_state, decode_policy
-from rl_agents.mcts import MCTSNode, mcts_search
+from rl_agents.networks import AlphaBlokusNet, quantize_for_inference, bf16_autocast, check_model_device
+from rl_agents.policy_wrapper import encode_state, encode_states, decode_policy
+from rl_agents.inference_server import InferenceServer
+from rl_agents.mcts import MCTSNode, mcts_search, select_leaf, undo_path, evaluate_leaves, expand_and_backup
 # from .rollout_utils import random_rollout
 
 __all__ = [
     "AlphaBlokusNet",
+    "quantize_for_inference",
+    "bf16_autocast",
+    "check_model_device",
     "encode_state",
+    "encode_states",
     "decode_policy",
+    "InferenceServer",
     "MCTSNode",
-    "mcts_search"
+    "mcts_search",
+    "select_leaf",
+    "undo_path",
+    "evaluate_leaves",
+    "expand_and_backup"
 ]
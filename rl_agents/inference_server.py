@@ -0,0 +1,97 @@
+# rl_agents/inference_server.py
+
+import queue
+import threading
+import time
+import torch
+from rl_agents.networks import bf16_autocast
+
+class InferenceServer:
+    """
+    Batches network calls coming from several threads (e.g. concurrent
+    self-play games) into single forward passes.
+
+    The server is called like the model itself, server(board_t, piece_t),
+    so it can be handed to mcts_search in place of the model. Each call is
+    queued for a background thread, which waits until max_batch states are
+    queued or timeout seconds have passed since the first one, runs the
+    model once on the concatenated batch and hands every caller back its
+    own slice of (policy_logits, values). As in evaluate_leaves, the forward
+    pass runs under bf16 autocast on CUDA (autocast is per-thread, so the
+    callers' contexts do not reach the server thread).
+    """
+    def __init__(self, model, max_batch=64, timeout=0.001):
+        self.model = model
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self._requests = queue.Queue()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._serve, name="InferenceServer", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stop the server thread once the requests queued so far are answered.
+        """
+        self._requests.put(None)
+        self._thread.join()
+        self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def __call__(self, board_t, piece_t):
+        reply = queue.Queue(maxsize=1)
+        self._requests.put((board_t, piece_t, reply))
+        result = reply.get()
+        if isinstance(result, BaseException):
+            raise result
+        return result
+
+    def _serve(self):
+        stopping = False
+        while not stopping:
+            request = self._requests.get()
+            if request is None:
+                return
+            batch = [request]
+            n_states = request[0].shape[0]
+
+            # gather more requests until the batch is full or the timeout runs out
+            deadline = time.monotonic() + self.timeout
+            while n_states < self.max_batch:
+                try:
+                    request = self._requests.get(timeout=max(deadline - time.monotonic(), 0.0))
+                except queue.Empty:
+                    break
+                if request is None:
+                    stopping = True
+                    break
+                batch.append(request)
+                n_states += request[0].shape[0]
+
+            self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        try:
+            boards = torch.cat([board_t for board_t, _, _ in batch])
+            pieces = torch.cat([piece_t for _, piece_t, _ in batch])
+            with torch.inference_mode(), bf16_autocast(boards.device):
+                policy_logits, values = self.model(boards, pieces)
+            policy_logits, values = policy_logits.float(), values.float()
+        except Exception as e:
+            for _, _, reply in batch:
+                reply.put(e)
+            return
+
+        start = 0
+        for board_t, _, reply in batch:
+            end = start + board_t.shape[0]
+            reply.put((policy_logits[start:end], values[start:end]))
+            start = end
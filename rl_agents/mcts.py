@@ -6,29 +6,109 @@ from typing import Dict, Tuple
 import torch
 import numpy as np
 
-from game_engine.board import BoardState
-from game_engine.rules import get_legal_moves, apply_move, is_terminal
+from game_engine.board import BoardState, piece_ids
+from game_engine.rules import get_legal_moves, apply_move_inplace, undo_move, is_terminal
 from game_engine.scoring import compute_final_scores
-from rl_agents.policy_wrapper import encode_state, decode_policy
+from game_engine.kernels import HAVE_NUMBA, njit
+from rl_agents.networks import bf16_autocast
+from rl_agents.policy_wrapper import encode_state, encode_states, decode_policy
 
 class MCTSNode:
     """
     A node in the MCTS tree.
     Stores:
     - parent
-    - children: dict { (piece_id, move_placement_idx): MCTSNode } or "pass"
-    - prior_prob for each child
-    - visit_count, total_value
+    - move: the move (None = pass) that leads here from parent
+    - index: this node's slot in the parent's child arrays
     - if expanded
+    - legal_moves: the legal moves of this node's state, set by expand_node
+    - the network encoding of its state, see encoded()
+
+    Child statistics live on the parent as parallel arrays (structure of
+    arrays), one slot per child, so UCB selection is a single vectorized
+    pass instead of a Python loop over child objects:
+    - child_keys[i]: action_key (piece_id, move_placement_idx) or ('pass', 0)
+    - child_moves[i]: the move for that child
+    - child_priors[i], child_visits[i], child_values[i] (total value)
+    - child_index: {action_key: i}
+    - child_slots_by_pid: {piece_id: [i, ...]}, the slots of that piece's placements
+    - child_actions[i]: piece-level action of slot i (piece_id, or 21 for pass), as an array
+    Child MCTSNode objects are only created (get_child) once a child is
+    actually visited; children maps action_key -> those nodes.
+    A node's own visit_count / total_value read its slot in the parent's
+    arrays; the root (no parent) keeps them itself.
+
+    Only the root needs a materialized state; mcts_search reaches every
+    other node by applying the moves along the path in place (and undoing
+    them), so child nodes are created without one. Reading node.state on
+    such a child builds it on demand from the nearest ancestor that has a
+    state and keeps it; assign None to release it again.
     """
-    def __init__(self, state: BoardState, parent=None):
-        self.state = state
-        self.parent = parent
-        self.children = {}  # map from action_key -> child node
-        self.visit_count = 0
-        self.total_value = 0.0
-        self.priors = {}  # map from action_key -> prior prob
+    def __init__(self, state: BoardState = None, parent=None, move=None, index=0):
+        self._state = state
+        self._parent = parent
+        self.move = move
+        self.index = index
         self.expanded = False
+        self.legal_moves = None
+        self._encoded = None
+
+        self.children = {}  # map from action_key -> child node (visited children only)
+        self.child_keys = []
+        self.child_moves = []
+        self.child_index = {}
+        self.child_slots_by_pid = {}
+        self.child_actions = np.zeros(0, dtype=np.int64)
+        self.child_priors = np.zeros(0, dtype=np.float32)
+        self.child_visits = np.zeros(0, dtype=np.int32)
+        self.child_values = np.zeros(0, dtype=np.float32)
+
+        # Own statistics, only used while this node is a root
+        self._visit_count = 0
+        self._total_value = 0.0
+
+    @property
+    def state(self) -> BoardState:
+        if self._state is None and self._parent is not None:
+            # replay the moves from the nearest materialized ancestor on a copy of its state
+            moves = []
+            node = self
+            while node._state is None and node._parent is not None:
+                moves.append(node.move)
+                node = node._parent
+            state = node._state.clone()
+            for move in reversed(moves):
+                apply_move_inplace(state, move)
+            self._state = state
+        return self._state
+
+    @state.setter
+    def state(self, state: BoardState):
+        self._state = state
+
+    @property
+    def parent(self):
+        return self._parent
+
+    @parent.setter
+    def parent(self, parent):
+        if parent is None and self._parent is not None:
+            # Detached to become a new root: keep the statistics gathered so far
+            self._visit_count = self.visit_count
+            self._total_value = self.total_value
+        self._parent = parent
+
+    @property
+    def visit_count(self):
+        if self._parent is None:
+            return self._visit_count
+        return int(self._parent.child_visits[self.index])
+
+    @property
+    def total_value(self):
+        if self._parent is None:
+            return self._total_value
+        return float(self._parent.child_values[self.index])
 
     @property
     def mean_value(self):
@@ -36,49 +116,274 @@ class MCTSNode:
             return 0.0
         return self.total_value / self.visit_count
 
-def ucb_score(parent, child, c_puct=1.0):
+    def encoded(self, device='cpu'):
+        """
+        (board_channels [1,5,20,20], piece_vector [1,21]) for this node's state.
+        evaluate_leaves stores the encoding it computes for a leaf, so a node
+        that later becomes a root (e.g. a self-play training sample) is not
+        encoded twice; otherwise it is computed here once.
+        """
+        if self._encoded is None:
+            self._encoded = encode_state(self.state, device=device)
+        return self._encoded
+
+    def set_child_moves(self, keys, moves):
+        """
+        Set child_keys / child_moves and the lookups derived from them
+        (child_index, child_slots_by_pid, child_actions).
+        """
+        self.child_keys = keys
+        self.child_moves = moves
+        self.child_index = {key: i for i, key in enumerate(keys)}
+        slots_by_pid = {}
+        for i, key in enumerate(keys):
+            if key[0] != 'pass':
+                slots_by_pid.setdefault(key[0], []).append(i)
+        self.child_slots_by_pid = slots_by_pid
+        self.child_actions = np.array([21 if key[0] == 'pass' else key[0] for key in keys], dtype=np.int64)
+
+    def get_child(self, idx: int) -> "MCTSNode":
+        """
+        Return the child node in slot idx, creating it on first use.
+        """
+        key = self.child_keys[idx]
+        child = self.children.get(key)
+        if child is None:
+            child = MCTSNode(parent=self, move=self.child_moves[idx], index=idx)
+            self.children[key] = child
+        return child
+
+def ucb_scores(node: MCTSNode, c_puct=1.0) -> np.ndarray:
     """
-    UCB for MCTS, similar to AlphaGo's formula:
+    UCB for every child of node, similar to AlphaGo's formula:
     Q + c_puct * P * sqrt(parent_visits)/(1+child_visits)
+    Unvisited children score +inf so each gets tried once.
     """
-    if child.visit_count == 0:
-        return float('inf')
-    return child.mean_value + c_puct * child.priors.get(child.last_action_key, 0) * math.sqrt(parent.visit_count) / (1 + child.visit_count)
+    visits = node.child_visits
+    parent_sqrt = math.sqrt(node.visit_count)
+    unvisited = visits == 0
+    q = np.divide(node.child_values, visits, out=np.zeros_like(node.child_values), where=~unvisited)
+    scores = q + c_puct * parent_sqrt * node.child_priors / (1 + visits)
+    scores[unvisited] = np.inf
+    return scores
 
-def mcts_search(root: MCTSNode, model, n_simulations=50, c_puct=1.0, device='cpu'):
+@njit(cache=True)
+def _select_ucb(child_values, child_visits, child_priors, parent_sqrt, c_puct):
+    """
+    Index of the child with the highest UCB (as in ucb_scores), in a single
+    compiled pass without temporary arrays. The first unvisited child wins
+    outright, matching np.argmax over its +inf score.
+    """
+    best = 0
+    best_score = -np.inf
+    for i in range(child_visits.shape[0]):
+        n = child_visits[i]
+        if n == 0:
+            return i
+        score = child_values[i] / n + c_puct * parent_sqrt * child_priors[i] / (1 + n)
+        if score > best_score:
+            best_score = score
+            best = i
+    return best
+
+def mcts_search(root: MCTSNode, model, n_simulations=50, c_puct=1.0, device='cpu',
+                batch_size=8, virtual_loss=1.0, rng=None):
     """
     Perform MCTS from the root node for n_simulations. Each simulation:
     1. Select
     2. Expand
     3. Evaluate
     4. Backup
+
+    Leaves are evaluated in batches: up to batch_size selections are made
+    first, each marking its path with a virtual loss so the next selection
+    is steered elsewhere, then all pending leaves go through the network in
+    a single forward pass before being expanded and backed up.
+
+    If rng (a np.random.Generator) is given, ties between the best UCB
+    scores are broken at random instead of by child order.
+    """
+    # One working copy of the root state, walked down and back up with make/unmake
+    state = root.state.clone()
+
+    sims_done = 0
+    while sims_done < n_simulations:
+        # 1) Select up to batch_size distinct leaves
+        pending = []
+        while sims_done < n_simulations and len(pending) < batch_size:
+            node, path = select_leaf(root, state, c_puct, rng)
+            if is_terminal(state):
+                # no network call needed, back up the final score right away
+                backup_value(node, terminal_value(state))
+                undo_path(state, path)
+                sims_done += 1
+                continue
+            if node in pending:
+                # selection keeps landing on a pending leaf, evaluate what we have
+                undo_path(state, path)
+                break
+            add_virtual_loss(node, virtual_loss)
+            # the leaf keeps its own copy until it has been evaluated and expanded;
+            # this is the only place a non-root state is materialized
+            if node._state is None:
+                node.state = state.clone()
+            pending.append(node)
+            undo_path(state, path)
+            sims_done += 1
+
+        if not pending:
+            continue
+
+        # 2-4) Evaluate all pending leaves at once, then expand and back up each
+        policy_logits, values = evaluate_leaves(pending, model, device)
+        for i, node in enumerate(pending):
+            remove_virtual_loss(node, virtual_loss)
+            expand_and_backup(node, policy_logits[i], values[i].item())
+            if node.parent is not None:
+                node.state = None
+
+def select_leaf(root: MCTSNode, state: BoardState, c_puct=1.0, rng=None):
+    """
+    Walk down from root, always taking the child with the highest UCB,
+    until reaching a node that is not expanded or has no children.
+    state starts as root's state and each traversed move is applied to it
+    in place. Returns (leaf, path) where path is the list of UndoTokens
+    to hand to undo_path once done with the leaf's state.
+    """
+    node = root
+    path = []
+    while node.expanded and len(node.child_keys) > 0:
+        # pick child with max UCB
+        if rng is None and HAVE_NUMBA:
+            idx = _select_ucb(node.child_values, node.child_visits, node.child_priors,
+                              math.sqrt(node.visit_count), c_puct)
+        elif rng is None:
+            idx = int(np.argmax(ucb_scores(node, c_puct)))
+        else:
+            scores = ucb_scores(node, c_puct)
+            best = np.flatnonzero(scores == scores.max())
+            idx = int(best[0]) if len(best) == 1 else int(rng.choice(best))
+        node = node.get_child(idx)
+        path.append(apply_move_inplace(state, node.move))
+    return node, path
+
+def search_root_statistics(state: BoardState, model, n_simulations=50, seed=None, c_puct=1.0,
+                           device='cpu', batch_size=8, virtual_loss=1.0):
+    """
+    Run an independent search from state and return its root's child statistics
+    as (child_keys, child_moves, child_priors, child_visits, child_values).
+    This is one worker's share of a root-parallel search; seed drives the random
+    tie-breaking so that workers explore different children.
+    """
+    root = MCTSNode(state)
+    mcts_search(root, model, n_simulations=n_simulations, c_puct=c_puct, device=device,
+                batch_size=batch_size, virtual_loss=virtual_loss, rng=np.random.default_rng(seed))
+    return root.child_keys, root.child_moves, root.child_priors, root.child_visits, root.child_values
+
+def merge_root_statistics(root: MCTSNode, results):
+    """
+    Root parallelization: make root an expanded node whose children carry the
+    summed visits / values (and averaged priors) of several search_root_statistics
+    results for root's state. Child subtrees are not kept.
+
+    Children are matched by their move (None = pass) rather than by their key:
+    a (piece_id, idx) key depends on the order in which a worker enumerated the
+    legal moves, which is not guaranteed to be the same in every worker. The
+    merged children get fresh keys in the same (piece_id, idx) scheme.
     """
-    for _ in range(n_simulations):
-        node = root
-        # 1) Select
-        while node.expanded and len(node.children) > 0:
-            # pick child with max UCB
-            best_action, best_child = None, None
-            best_score = -999999.0
-            for action_key, child in node.children.items():
-                score = ucb_score(node, child, c_puct)
-                if score > best_score:
-                    best_score = score
-                    best_action = action_key
-                    best_child = child
-            node = best_child
-        # 2) Expand if not terminal
-        if not node.expanded and not is_terminal(node.state):
-            expand_node(node, model, device)
-        # 3) Evaluate
-        value = evaluate_node(node, model, device)
-        # 4) Backup
-        backup_value(node, value)
-
-def expand_node(node: MCTSNode, model, device='cpu'):
+    index = {}
+    keys = []
+    moves = []
+    n_placements = {}  # piece_id -> merged placements of that piece so far
+    for _, child_moves, _, _, _ in results:
+        for move in child_moves:
+            if move not in index:
+                index[move] = len(keys)
+                if move is None:
+                    keys.append(('pass', 0))
+                else:
+                    idx = n_placements.get(move[0], 0)
+                    n_placements[move[0]] = idx + 1
+                    keys.append((move[0], idx))
+                moves.append(move)
+
+    priors = np.zeros(len(keys), dtype=np.float32)
+    visits = np.zeros(len(keys), dtype=np.int32)
+    values = np.zeros(len(keys), dtype=np.float32)
+    for _, child_moves, child_priors, child_visits, child_values in results:
+        slots = [index[move] for move in child_moves]
+        priors[slots] += child_priors / len(results)
+        visits[slots] += child_visits
+        values[slots] += child_values
+
+    root.children = {}
+    root.set_child_moves(keys, moves)
+    root.child_priors = priors
+    root.child_visits = visits
+    root.child_values = values
+    root.expanded = True
+    root._visit_count += int(visits.sum())
+    root._total_value += float(values.sum())
+
+def undo_path(state: BoardState, path):
+    """
+    Revert the moves applied by select_leaf, most recent first.
+    """
+    for token in reversed(path):
+        undo_move(state, token)
+
+def add_virtual_loss(node: MCTSNode, virtual_loss=1.0):
+    """
+    Temporarily count a losing visit on node and all its ancestors, so that
+    further selections in the same batch prefer other paths.
+    """
+    _add_to_path(node, 1, -virtual_loss)
+
+def remove_virtual_loss(node: MCTSNode, virtual_loss=1.0):
+    """
+    Undo add_virtual_loss along the same path.
+    """
+    _add_to_path(node, -1, virtual_loss)
+
+def _add_to_path(node: MCTSNode, visits: int, value: float):
+    """
+    Add visits / value to the statistics of node and all its ancestors.
+    """
+    cur = node
+    while cur.parent is not None:
+        parent = cur.parent
+        parent.child_visits[cur.index] += visits
+        parent.child_values[cur.index] += value
+        cur = parent
+    cur._visit_count += visits
+    cur._total_value += value
+
+def evaluate_leaves(nodes, model, device='cpu'):
+    """
+    Run the network once on a batch of (non-terminal) leaf nodes.
+    Returns (policy_logits [N, 22], values [N]) as float32.
+    On CUDA the forward pass runs under bf16 autocast.
+    """
+    board_t, piece_t = encode_states([node.state for node in nodes], device=device)
+    for i, node in enumerate(nodes):
+        node._encoded = (board_t[i:i+1], piece_t[i:i+1])
+    with torch.inference_mode(), bf16_autocast(device):
+        policy_logits, values = model(board_t, piece_t)
+    return policy_logits.float(), values.float()
+
+def expand_and_backup(node: MCTSNode, policy_logits, value: float):
+    """
+    Finish one simulation for an evaluated leaf: expand it using its
+    policy logits (if not done yet) and back up its value.
+    """
+    if not node.expanded:
+        expand_node(node, policy_logits)
+    backup_value(node, value)
+
+def expand_node(node: MCTSNode, policy_logits):
     """
     Expand the node by:
-    1) Use the network policy to get piece distribution
+    1) Use the network policy (logits of shape [22]) to get piece distribution
     2) For each piece (or pass), enumerate next states (especially all placements)
     3) Create child nodes
     """
@@ -87,18 +392,12 @@ def expand_node(node: MCTSNode, model, device='cpu'):
         node.expanded = True
         return
 
-    # get policy from network
-    board_t, piece_t = encode_state(state)
-    board_t = board_t.to(device)
-    piece_t = piece_t.to(device)
-    with torch.no_grad():
-        policy_logits, _ = model(board_t, piece_t)
-    policy_logits = policy_logits[0]  # shape [22]
-    
-    # legal moves
-    legal_moves = get_legal_moves(state)
+    # legal moves (enumerated once per node)
+    if node.legal_moves is None:
+        node.legal_moves = get_legal_moves(state)
+    legal_moves = node.legal_moves
     # piece IDs that are still available
-    legal_piece_ids = state.pieces_remaining[state.current_player]
+    legal_piece_ids = piece_ids(state.pieces_remaining[state.current_player])
 
     # decode policy into piece-level distribution
     piece_policy = decode_policy(policy_logits, legal_piece_ids, temperature=1.0)  
@@ -115,6 +414,11 @@ def expand_node(node: MCTSNode, model, device='cpu'):
     # But pass might appear in the policy distribution.
     pass_prob = piece_policy.get('pass', 0.0)
 
+    # Gather the children's keys, moves and priors, then store them as arrays
+    keys = []
+    moves = []
+    priors = []
+
     # For each piece
     for pid in legal_piece_ids:
         pprob = piece_policy.get(pid, 0.0)
@@ -128,54 +432,39 @@ def expand_node(node: MCTSNode, model, device='cpu'):
             continue
         split_prob = pprob / len(placements)
         for idx, mv in enumerate(placements):
-            child_state = apply_move(state, mv)
-            child_node = MCTSNode(child_state, parent=node)
-            # We'll store in child_node a reference to its action_key for UCB
-            action_key = (pid, idx)
-            child_node.last_action_key = action_key
-            node.children[action_key] = child_node
-            node.priors[action_key] = split_prob
+            keys.append((pid, idx))
+            moves.append(mv)
+            priors.append(split_prob)
 
     # If pass is a real option (network or forced)
     if pass_prob > 0.0:
-        # create pass child
-        mv_pass = None
-        pass_state = apply_move(state, mv_pass)
-        pass_node = MCTSNode(pass_state, parent=node)
-        pass_node.last_action_key = ('pass', 0)
-        node.children[('pass', 0)] = pass_node
-        node.priors[('pass', 0)] = pass_prob
+        # pass child
+        keys.append(('pass', 0))
+        moves.append(None)
+        priors.append(pass_prob)
+
+    n_children = len(keys)
+    node.set_child_moves(keys, moves)
+    node.child_priors = np.array(priors, dtype=np.float32)
+    node.child_visits = np.zeros(n_children, dtype=np.int32)
+    node.child_values = np.zeros(n_children, dtype=np.float32)
 
     # Mark expanded
     node.expanded = True
 
-def evaluate_node(node: MCTSNode, model, device='cpu'):
-    """
-    Evaluate the node's state:
-    - if terminal, compute final score outcome from the perspective of node.state.current_player
-    - otherwise, use the value network
-    Returns a float in [-1,1] or so.
-    """
-    st = node.state
-    if is_terminal(st):
-        # compute final score
-        final_scores = stt_final_scores(st)
-        # vantage point is st.current_player at the moment the game ended, though 
-        # in a multi-player game, you might define a different scheme. 
-        # We'll do a naive approach: the "value" is final_scores[current_player] 
-        # relative to others, or just normalized. Up to you.
-        # For simplicity, let's do final_scores[current_player] / 100 
-        # (arbitrary scaling).
-        val = final_scores[st.current_player] / 100.0
-        return val
-    else:
-        # Use the network value
-        board_t, piece_t = encode_state(st)
-        board_t = board_t.to(device)
-        piece_t = piece_t.to(device)
-        with torch.no_grad():
-            _, value = model(board_t, piece_t)
-        return value.item()
+def terminal_value(st: BoardState) -> float:
+    """
+    Value of a terminal state from the perspective of st.current_player.
+    """
+    # compute final score
+    final_scores = compute_final_scores(st)
+    # vantage point is st.current_player at the moment the game ended, though 
+    # in a multi-player game, you might define a different scheme. 
+    # We'll do a naive approach: the "value" is final_scores[current_player] 
+    # relative to others, or just normalized. Up to you.
+    # For simplicity, let's do final_scores[current_player] / 100 
+    # (arbitrary scaling).
+    return final_scores[st.current_player] / 100.0
 
 def backup_value(node: MCTSNode, value: float):
     """
@@ -191,14 +480,4 @@ def backup_value(node: MCTSNode, value: float):
     # Here, we won't invert or rotate. We'll just store the same value for each ancestor. 
     # This isn't strictly correct for multi-player, but let's keep it simple.
 
-    cur = node
-    while cur is not None:
-        cur.visit_count += 1
-        cur.total_value += value
-        cur = cur.parent
-
-def stt_final_scores(st: BoardState):
-    """
-    Helper to call compute_final_scores properly. Returns list of length 4.
-    """
-    return compute_final_scores(st)
+    _add_to_path(node, 1, value)
@@ -1,9 +1,28 @@
 # rl_agents/networks.py
 
+import copy
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
 
+class ResidualBlock(nn.Module):
+    """
+    AlphaZero-style residual block: (Conv3x3 + BN + ReLU) x2 with a skip connection.
+    The second ReLU is applied after adding the skip.
+    """
+
+    def __init__(self, channels=32):
+        super().__init__()
+        self.conv1 = nn.Conv2d(channels, channels, kernel_size=3, padding=1, bias=False)
+        self.bn1 = nn.BatchNorm2d(channels)
+        self.conv2 = nn.Conv2d(channels, channels, kernel_size=3, padding=1, bias=False)
+        self.bn2 = nn.BatchNorm2d(channels)
+
+    def forward(self, x):
+        out = F.relu(self.bn1(self.conv1(x)))
+        out = self.bn2(self.conv2(out))
+        return F.relu(out + x)
+
 class AlphaBlokusNet(nn.Module):
     """
     Combined policy + value network for Blokus.
@@ -16,29 +35,23 @@ class AlphaBlokusNet(nn.Module):
       - value: shape [batch] (scalar)
     """
 
-    def __init__(self):
+    def __init__(self, channels=32, n_res_blocks=4):
         super().__init__()
 
-        # Convolutional layers for the 5-channel board
-        self.conv1 = nn.Conv2d(in_channels=5, out_channels=32, kernel_size=3, padding=1)
-        self.conv2 = nn.Conv2d(in_channels=32, out_channels=32, kernel_size=3, padding=1)
-        self.conv3 = nn.Conv2d(in_channels=32, out_channels=32, kernel_size=3, padding=1)
-        # Possibly add more layers or residual blocks in a real project
-
-        # We'll flatten the conv output and then combine with the piece_vector
-        # The board is 20x20, after 3 conv layers, shape is still [64, 20, 20]
-        # We'll do a global average pooling or flatten
-        self.global_pool = nn.AdaptiveAvgPool2d((1, 1))
-
-        # Now we combine the pooled conv features (64 dims) with the 21-dim piece vector
-        # So total = 64 + 21 = 85
-        self.fc_combine = nn.Linear(32 + 21, 128)
+        # Stem conv for the 5-channel board, then a residual tower
+        self.conv_in = nn.Conv2d(in_channels=5, out_channels=channels, kernel_size=3, padding=1, bias=False)
+        self.bn_in = nn.BatchNorm2d(channels)
+        self.res_blocks = nn.Sequential(*[ResidualBlock(channels) for _ in range(n_res_blocks)])
 
         # Policy head
-        self.policy_head = nn.Linear(128, 22)  # 21 pieces + 1 pass
-    
-        # Value head
-        self.value_head1 = nn.Linear(128, 32)
+        # A 1x1 conv scores every cell; its softmax is used to pool the board features,
+        # so the piece logits see *where* the net wants to play instead of a plain average.
+        self.policy_conv = nn.Conv2d(channels, 1, kernel_size=1)
+        self.piece_head = nn.Linear(channels + 21, 22)  # 21 pieces + 1 pass
+
+        # Value head keeps global average pooling
+        self.global_pool = nn.AdaptiveAvgPool2d((1, 1))
+        self.value_head1 = nn.Linear(channels + 21, 32)
         self.value_head2 = nn.Linear(32, 1)
 
     def forward(self, board_channels, piece_vector):
@@ -46,26 +59,64 @@ class AlphaBlokusNet(nn.Module):
         board_channels: [batch, 5, 20, 20] float or bool
         piece_vector:   [batch, 21] float or bool
         """
-        x = F.relu(self.conv1(board_channels))
-        x = F.relu(self.conv2(x))
-        x = F.relu(self.conv3(x))
-
-        # Global average pool
-        # shape -> [batch, 64, 1, 1]
-        x = self.global_pool(x)
-        x = x.view(x.size(0), -1)  # [batch, 64]
-
-        # Concatenate piece_vector
-        x = torch.cat([x, piece_vector], dim=1)  # -> [batch, 64 + 21]
+        x = F.relu(self.bn_in(self.conv_in(board_channels)))
+        x = self.res_blocks(x)                       # [batch, C, 20, 20]
+        feats = x.flatten(2)                         # [batch, C, 400]
 
-        x = F.relu(self.fc_combine(x))  # -> [batch, 128]
-
-        # Policy
-        policy_logits = self.policy_head(x)  # [batch, 22]
+        # Policy: pool features with the per-cell location weights
+        location_logits = self.policy_conv(x).flatten(1)         # [batch, 400]
+        location_weights = F.softmax(location_logits, dim=1)
+        policy_feat = (feats * location_weights.unsqueeze(1)).sum(dim=2)  # [batch, C]
+        policy_logits = self.piece_head(torch.cat([policy_feat, piece_vector], dim=1))  # [batch, 22]
 
         # Value
-        vh = F.relu(self.value_head1(x))      # [batch, 64]
+        pooled = self.global_pool(x).flatten(1)      # [batch, C]
+        vh = F.relu(self.value_head1(torch.cat([pooled, piece_vector], dim=1)))  # [batch, 32]
         value = self.value_head2(vh)          # [batch, 1]
         value = torch.tanh(value)             # range -1..1, or do nothing if you prefer
 
         return policy_logits, value.squeeze(-1)
+
+def quantize_for_inference(model: AlphaBlokusNet, calibration_batches, backend='x86'):
+    """
+    Return an int8 copy of model for CPU inference (MCTS leaf evaluation),
+    made with FX graph-mode static quantization of the conv and linear layers.
+
+    calibration_batches: iterable of (board_channels, piece_vector) CPU batches
+    used to pick activation ranges, e.g. a few replay-buffer samples.
+    The original FP32 model is left untouched and keeps being trained.
+    """
+    # Imported here: the quantization APIs are only needed for this path
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+    batches = list(calibration_batches)
+    fp32_model = copy.deepcopy(model).cpu().eval()
+    prepared = prepare_fx(fp32_model, get_default_qconfig_mapping(backend), batches[0])
+    with torch.no_grad():
+        for board_t, piece_t in batches:
+            prepared(board_t, piece_t)
+    return convert_fx(prepared)
+
+def bf16_autocast(device):
+    """
+    Autocast context running the network in bfloat16 on CUDA devices that
+    support it (bf16 keeps the FP32 exponent range, so no loss scaling is
+    needed). On other devices it is a disabled, no-op context.
+    """
+    device = torch.device(device)
+    enabled = device.type == 'cuda' and torch.cuda.is_bf16_supported()
+    return torch.autocast(device_type=device.type, dtype=torch.bfloat16, enabled=enabled)
+
+def check_model_device(model: nn.Module, device):
+    """
+    Raise ValueError unless model's parameters live on `device` (compared by
+    device type). Inputs are always moved to the model, never the model to
+    the inputs, so a mismatch would otherwise surface as a failed or silently
+    slow forward pass deep inside MCTS.
+    """
+    param = next(model.parameters(), None)
+    expected = torch.device(device).type
+    if param is not None and param.device.type != expected:
+        raise ValueError(f"model is on {param.device}, expected {expected}; "
+                         f"call model.to({str(device)!r}) once before self-play/evaluation")
@@ -2,48 +2,51 @@
 
 import torch
 import numpy as np
-from game_engine.board import BoardState, BOARD_SIZE
+from game_engine.board import BoardState
 from game_engine.rules import get_legal_moves
 
-def encode_state(board_state: BoardState) -> (torch.Tensor, torch.Tensor):
+def encode_state(board_state: BoardState, device='cpu') -> (torch.Tensor, torch.Tensor):
     """
     Convert board_state into (board_channels, piece_vector).
-    board_channels shape: [5, 20, 20]
-    piece_vector shape: [21]
+    board_channels shape: [1, 5, 20, 20]
+    piece_vector shape: [1, 21]
 
     - Channels 0..3: Occupancy by color c
     - Channel 4: 1 if cell is occupied by board_state.current_player, else 0
     - piece_vector[i] = 1 if piece i is STILL available for current_player, else 0
+
+    The tensors are built directly on `device` (see encode_states).
     """
-    current_player = board_state.current_player
+    return encode_states([board_state], device=device)
 
-    board_channels = np.zeros((5, BOARD_SIZE, BOARD_SIZE), dtype=np.float32)
+def encode_states(board_states, device='cpu') -> (torch.Tensor, torch.Tensor):
+    """
+    Batched encode_state: returns board_channels [N, 5, 20, 20] and
+    piece_vector [N, 21] as float32 tensors on `device`.
 
-    # Fill occupancy channels
-    for r in range(BOARD_SIZE):
-        for c in range(BOARD_SIZE):
-            occupant = board_state.board_grid[r][c]
-            if occupant is not None:
-                board_channels[occupant, r, c] = 1.0
-                # occupant in [0..3]
+    Only the raw uint8 grids (400 bytes per state) and uint8 piece masks are
+    copied to the device; the one-hot channels are expanded there.
+    """
+    n = len(board_states)
 
-    # Channel 4: highlight squares of the current_player
-    for r in range(BOARD_SIZE):
-        for c in range(BOARD_SIZE):
-            occupant = board_state.board_grid[r][c]
-            if occupant == current_player:
-                board_channels[4, r, c] = 1.0
+    # uint8 inputs on the host
+    grids = np.stack([bs.board_grid for bs in board_states])  # [N, 20, 20], EMPTY or 0..3
+    players = np.array([bs.current_player for bs in board_states], dtype=np.uint8)
+    masks = np.array([bs.pieces_remaining[bs.current_player] for bs in board_states], dtype=np.int64)
+    piece_mask = ((masks[:, None] >> np.arange(21)) & 1).astype(np.uint8)  # [N, 21]
 
-    # piece_vector
-    piece_vec = np.zeros((21,), dtype=np.float32)
-    for p_id in board_state.pieces_remaining[current_player]:
-        piece_vec[p_id] = 1.0
+    grids_t = torch.from_numpy(grids).to(device)
+    players_t = torch.from_numpy(players).to(device)
+    piece_t = torch.from_numpy(piece_mask).to(device)
 
-    # Convert to torch tensors
-    board_t = torch.from_numpy(board_channels).unsqueeze(0)  # shape [1, 5, 20, 20]
-    piece_t = torch.from_numpy(piece_vec).unsqueeze(0)       # shape [1, 21]
+    # Channels 0..3 in one broadcast compare (EMPTY matches none of them)
+    color_ids = torch.arange(4, dtype=torch.uint8, device=device).view(1, 4, 1, 1)
+    occupancy = grids_t.unsqueeze(1) == color_ids               # [N, 4, 20, 20]
+    # Channel 4: squares of each state's current_player
+    own = (grids_t == players_t.view(n, 1, 1)).unsqueeze(1)    # [N, 1, 20, 20]
 
-    return board_t, piece_t
+    board_t = torch.cat([occupancy, own], dim=1).float()
+    return board_t, piece_t.float()
 
 def decode_policy(policy_logits, legal_piece_ids, temperature=1.0):
     """
@@ -58,42 +61,34 @@ def decode_policy(policy_logits, legal_piece_ids, temperature=1.0):
 
     # policy_logits: shape [22], containing 21 pieces + 1 pass
     # legal_piece_ids: set of piece IDs that remain for the current player
-    # We'll do a numpy softmax
-
-    logits_np = policy_logits.detach().cpu().numpy()  # shape [22]
-    # Filter out piece IDs that are not in legal_piece_ids
-    # We'll also handle the pass action (index = 21)
-    # We'll create a mask
-    mask = np.zeros_like(logits_np, dtype=bool)
-    for pid in legal_piece_ids:
-        mask[pid] = True
-    # Mark the pass action as always legal
-    pass_index = 21
-    mask[pass_index] = True
+    # Everything stays on policy_logits' device; only the final probs come back to the host.
 
     # If no legal pieces (empty set?), then pass is forced
     if len(legal_piece_ids) == 0:
         # produce a dictionary that pass=1.0
         return { 'pass': 1.0 }
 
+    legal_ids = sorted(legal_piece_ids)
+
+    # Mask of legal actions; the pass action (index = 21) is always legal
+    pass_index = 21
+    mask = torch.zeros(22, dtype=torch.bool, device=policy_logits.device)
+    mask[legal_ids] = True
+    mask[pass_index] = True
+
     # masked logits
-    masked_logits = np.full_like(logits_np, -1e9)  # large negative
-    masked_logits[mask] = logits_np[mask]
+    masked_logits = policy_logits.detach().masked_fill(~mask, -1e9)  # large negative
 
     # Apply temperature
     if temperature > 1e-8:
-        scaled_logits = masked_logits / temperature
-        exps = np.exp(scaled_logits - np.max(scaled_logits))
-        probs = exps / np.sum(exps)
+        probs = torch.softmax(masked_logits / temperature, dim=0)
     else:
         # Argmax
-        probs = np.zeros_like(masked_logits)
-        probs[np.argmax(masked_logits)] = 1.0
+        probs = torch.zeros_like(masked_logits)
+        probs[torch.argmax(masked_logits)] = 1.0
 
-    out_dict = {}
-    for i in range(21):
-        if i in legal_piece_ids:
-            out_dict[i] = probs[i]
+    probs = probs.tolist()
+    out_dict = {i: probs[i] for i in legal_ids}
     out_dict['pass'] = probs[pass_index]
 
     return out_dict
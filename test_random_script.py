@@ -8,11 +8,14 @@ To run:
   python test_random_game.py
 """
 
+import logging
 import random
 from game_engine import BoardState, get_legal_moves, apply_move, is_terminal, compute_final_scores
 from visualization import print_board
 from visualization.pygame_viewer import replay_game
 
+logger = logging.getLogger("RandomGame")
+
 def play_random_blokus_game():
     state = BoardState()
     states_timeline = []
@@ -27,15 +30,19 @@ def play_random_blokus_game():
         if len(legal_moves) == 0:
             # No moves -> pass
             next_state = apply_move(state, None)
-            print(f"Turn {turn_number}: Player {current_player} passes.")
+            logger.debug(f"Turn {turn_number}: Player {current_player} passes.")
         else:
             chosen_move = random.choice(legal_moves)
             next_state = apply_move(state, chosen_move)
             piece_id, row_off, col_off, shape_coords = chosen_move
-            print(f"Turn {turn_number}: Player {current_player} places piece {piece_id} at ({row_off},{col_off}).")
-        states_timeline.append(state.clone())
+            logger.debug(f"Turn {turn_number}: Player {current_player} places piece {piece_id} at ({row_off},{col_off}).")
+        # apply_move returned a fresh state and leaves this one untouched, so it can
+        # go into the timeline as is
+        states_timeline.append(state)
         state = next_state
-        if turn_number % 5 == 0:  # Print board every few turns, or every turn if you like
+        # Print board every few turns, or every turn if you like; rendering is
+        # skipped entirely unless debug output is on
+        if turn_number % 5 == 0 and logger.isEnabledFor(logging.DEBUG):
             print_board(state.board_grid)
 
     # Game over
@@ -49,4 +56,7 @@ def play_random_blokus_game():
     replay_game(states_timeline)
 
 if __name__ == "__main__":
+    # DEBUG only for this script's own logger, so libraries (e.g. numba) stay quiet
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    logger.setLevel(logging.DEBUG)
     play_random_blokus_game()
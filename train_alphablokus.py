@@ -26,6 +26,12 @@ def main():
     parser.add_argument("--replay_buffer_max", type=int, default=50000)
     parser.add_argument("--lr", type=float, default=1e-3)
     parser.add_argument("--eval_games", type=int, default=5)
+    parser.add_argument("--quantize_self_play", action="store_true")
+    parser.add_argument("--self_play_workers", type=int, default=1)
+    parser.add_argument("--leaf_batch_size", type=int, default=8)
+    parser.add_argument("--concurrent_games", type=int, default=1)
+    parser.add_argument("--root_workers", type=int, default=1)
+    parser.add_argument("--compile_model", action="store_true")
     args = parser.parse_args()
 
     logging.basicConfig(level=logging.INFO)
@@ -42,7 +48,13 @@ def main():
                       batch_size=args.batch_size,
                       train_steps_per_iter=args.train_steps_per_iter,
                       replay_buffer_max=args.replay_buffer_max,
-                      lr=args.lr)
+                      lr=args.lr,
+                      quantize_self_play=args.quantize_self_play,
+                      self_play_workers=args.self_play_workers,
+                      leaf_batch_size=args.leaf_batch_size,
+                      concurrent_games=args.concurrent_games,
+                      root_workers=args.root_workers,
+                      compile_model=args.compile_model)
 
     # Evaluate
     avg_score = evaluate_vs_random(model, n_games=args.eval_games, device=args.device)
@@ -2,11 +2,15 @@
 
 import logging
 import random
+import numpy as np
+import torch
 from game_engine.board import BoardState
 from game_engine.rules import get_legal_moves, apply_move, is_terminal
 from game_engine.scoring import compute_final_scores
 from rl_agents.mcts import MCTSNode, mcts_search
+from rl_agents.networks import check_model_device
 
+@torch.inference_mode()
 def evaluate_vs_random(model, n_games=10, device='cpu'):
     """
     Plays n_games where the model always moves for the current_player
@@ -19,28 +23,46 @@ def evaluate_vs_random(model, n_games=10, device='cpu'):
     logger = logging.getLogger("AlphaBlokusEval")
     logger.setLevel(logging.INFO)
 
+    # the model has to already be on device; only the encoded states are moved there
+    check_model_device(model, device)
+
+    # BatchNorm has to use its running stats (and not update them) while playing;
+    # the caller's train/eval mode is restored afterwards
+    was_training = model.training
+    model.eval()
+    try:
+        avg_score = _play_vs_random(model, n_games, device)
+    finally:
+        model.train(was_training)
+
+    logger.info(f"Avg final score for color0 across {n_games} games = {avg_score}")
+    return avg_score
+
+def _play_vs_random(model, n_games, device):
+    """
+    The games of evaluate_vs_random; returns the average final score of color 0.
+    """
     total_score_sum = 0.0
     for g in range(n_games):
         st = BoardState()
+        # The search tree is kept from one turn to the next: the chosen child
+        # becomes the new root along with the visits it already has
+        root = MCTSNode(st)
         while not is_terminal(st):
             cur_player = st.current_player
             # model picks a move with MCTS
-            root = MCTSNode(st)
             mcts_search(root, model, n_simulations=30, device=device)
             # pick best move from child visits
-            best_child = None
-            best_visits = -1
-            chosen_action = None
-            for ak, child in root.children.items():
-                if child.visit_count > best_visits:
-                    best_visits = child.visit_count
-                    best_child = child
-                    chosen_action = ak
-            if best_child is None:
+            if len(root.child_keys) == 0:
                 # pass
                 st = apply_move(st, None)
+                root = MCTSNode(st)
             else:
+                best_child = root.get_child(int(np.argmax(root.child_visits)))
+                # materialize the child's state before detaching it
                 st = best_child.state
+                root = best_child
+                root.parent = None
 
         final_scores = compute_final_scores(st)
         # We'll sum up the model's color score. But "the model" is playing all 4 colors in a single-net approach.
@@ -49,6 +71,4 @@ def evaluate_vs_random(model, n_games=10, device='cpu'):
         # Let's just do color 0 as "our" color:
         total_score_sum += final_scores[0]
 
-    avg_score = total_score_sum / n_games
-    logger.info(f"Avg final score for color0 across {n_games} games = {avg_score}")
-    return avg_score
+    return total_score_sum / n_games
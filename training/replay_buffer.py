@@ -1,46 +1,111 @@
 # training/replay_buffer.py
 
-import random
+import numpy as np
 import torch
 
 class ReplayBuffer:
+    """
+    Fixed-size ring buffer of self-play samples, stored as preallocated
+    tensors (one per field) instead of a list of per-sample tuples, so that
+    push overwrites the oldest slot in place and sample is a single indexed
+    gather per field.
+
+    The board planes are one-hot, so they are kept as uint8 (a quarter of
+    the float32 size) and converted back to float32 when sampled.
+    """
     def __init__(self, max_size=100000):
         self.max_size = max_size
-        self.buffer = []
+        self.board = torch.empty((max_size, 5, 20, 20), dtype=torch.uint8)
+        self.piece = torch.empty((max_size, 21), dtype=torch.uint8)
+        self.pi = torch.empty((max_size, 22), dtype=torch.float32)
+        self.value = torch.empty(max_size, dtype=torch.float32)
+        self.idx = 0  # next slot to write
+        self.n = 0    # number of filled slots
 
     def push(self, samples):
         """
         samples is a list of (board_t, piece_t, pi, value)
         - board_t: shape [1,5,20,20]
         - piece_t: shape [1,21]
-        - pi: a list of length 22
+        - pi: a list (or array) of length 22
         - value: float
+        Once the buffer is full, each sample overwrites the oldest one.
+        The whole list is collated once and written as at most two slices
+        (before and after the ring wraps around).
+        """
+        if not samples:
+            return
+        # only the newest max_size samples would survive anyway
+        samples = samples[-self.max_size:]
+        fields = (
+            torch.cat([b_t for (b_t, _, _, _) in samples], dim=0),
+            torch.cat([p_t for (_, p_t, _, _) in samples], dim=0),
+            # pi / value go through one float32 numpy array each rather than
+            # torch.tensor's element-by-element walk of nested lists
+            torch.from_numpy(np.asarray([pi for (_, _, pi, _) in samples], dtype=np.float32)),
+            torch.from_numpy(np.asarray([val for (_, _, _, val) in samples], dtype=np.float32)),
+        )
+        storage = (self.board, self.piece, self.pi, self.value)
+
+        count = len(samples)
+        first = min(count, self.max_size - self.idx)
+        for store, data in zip(storage, fields):
+            store[self.idx:self.idx + first] = data[:first]
+            store[:count - first] = data[first:]
+        self.idx = (self.idx + count) % self.max_size
+        self.n = min(self.n + count, self.max_size)
+
+    def sample(self, batch_size, pin_memory=False):
+        """
+        Draw batch_size samples uniformly (with replacement).
+        Returns board_batch [B,5,20,20], piece_batch [B,21], pi_batch [B,22]
+        and value_batch [B], all float32.
+        With pin_memory the batch is returned in page-locked memory, so that
+        .to('cuda', non_blocking=True) can copy it asynchronously.
         """
-        for s in samples:
-            self.buffer.append(s)
-        while len(self.buffer) > self.max_size:
-            self.buffer.pop(0)  # remove oldest
-
-    def sample(self, batch_size):
-        batch = random.sample(self.buffer, batch_size)
-        # We'll collate them
-        board_batch = []
-        piece_batch = []
-        pi_batch = []
-        value_batch = []
-        for (b_t, p_t, pi, val) in batch:
-            board_batch.append(b_t)
-            piece_batch.append(p_t)
-            pi_batch.append(pi)
-            value_batch.append(val)
-
-        # stack
-        board_batch = torch.cat(board_batch, dim=0)  # shape [batch_size, 5, 20, 20]
-        piece_batch = torch.cat(piece_batch, dim=0)  # shape [batch_size, 21]
-        pi_batch = torch.tensor(pi_batch, dtype=torch.float32)  # [batch_size, 22]
-        value_batch = torch.tensor(value_batch, dtype=torch.float32)  # [batch_size]
-
-        return board_batch, piece_batch, pi_batch, value_batch
+        idxs = torch.randint(0, self.n, (batch_size,))
+        batch = (self.board[idxs].float(), self.piece[idxs].float(), self.pi[idxs], self.value[idxs])
+        if pin_memory:
+            batch = tuple(t.pin_memory() for t in batch)
+        return batch
 
     def __len__(self):
-        return len(self.buffer)
+        return self.n
+
+class BatchPrefetcher:
+    """
+    Serves training batches from a ReplayBuffer already on `device`, always
+    keeping the next batch in flight: on CUDA it is sampled into pinned
+    memory and copied on a side stream while the current batch trains.
+    On other devices batches are just sampled and moved one at a time.
+    """
+    def __init__(self, replay_buffer, batch_size, device='cpu'):
+        self.replay_buffer = replay_buffer
+        self.batch_size = batch_size
+        self.device = torch.device(device)
+        self.stream = torch.cuda.Stream(device=self.device) if self.device.type == 'cuda' else None
+        self._next_batch = None
+        if self.stream is not None:
+            self._preload()
+
+    def _preload(self):
+        batch = self.replay_buffer.sample(self.batch_size, pin_memory=True)
+        with torch.cuda.stream(self.stream):
+            self._next_batch = tuple(t.to(self.device, non_blocking=True) for t in batch)
+
+    def next(self):
+        """
+        Returns (board_batch, piece_batch, pi_batch, value_batch) on device.
+        """
+        if self.stream is None:
+            return tuple(t.to(self.device) for t in self.replay_buffer.sample(self.batch_size))
+
+        # make the compute stream wait for the copy, and keep the copied
+        # tensors alive until the compute stream is done with them
+        current = torch.cuda.current_stream(self.device)
+        current.wait_stream(self.stream)
+        batch = self._next_batch
+        for t in batch:
+            t.record_stream(current)
+        self._preload()
+        return batch
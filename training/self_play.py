@@ -1,15 +1,20 @@
 # training/self_play.py
 
 import random
+import numpy as np
 import torch
+import torch.multiprocessing as mp
+from concurrent.futures import ThreadPoolExecutor
 from typing import List
 from game_engine.board import BoardState
 from game_engine.rules import get_legal_moves, apply_move, is_terminal
 from game_engine.scoring import compute_final_scores
-from rl_agents.mcts import MCTSNode, mcts_search
-from rl_agents.policy_wrapper import encode_state, decode_policy
+from rl_agents.inference_server import InferenceServer
+from rl_agents.mcts import MCTSNode, mcts_search, search_root_statistics, merge_root_statistics
+from rl_agents.policy_wrapper import decode_policy
 
-def run_self_play_game(model, n_mcts_sim=50, device='cpu'):
+def run_self_play_game(model, n_mcts_sim=50, device='cpu', leaf_batch_size=8, virtual_loss=1.0,
+                       root_workers=1):
     """
     Runs a single 4-player self-play game using MCTS for each player's turn.
     Returns a list of (state_encoding, policy_target, value_target) for training.
@@ -20,8 +25,46 @@ def run_self_play_game(model, n_mcts_sim=50, device='cpu'):
 
     We do naive multi-player: each state only gets labeled from the vantage of the 
     color to move at that step.
+
+    Each search sends its leaves through the network leaf_batch_size at a time,
+    spreading the selections of a batch with virtual_loss (see mcts_search).
+
+    With root_workers > 1 (CPU only) every move is searched by that many worker
+    processes, each growing its own tree with n_mcts_sim // root_workers (at
+    least 2) simulations, and their root visit counts are summed (root parallelization).
     """
+    if root_workers > 1 and device == 'cpu':
+        model.share_memory()
+        with mp.Pool(root_workers, initializer=_init_self_play_worker, initargs=(model,)) as root_pool:
+            trajectory, final_scores = _play_self_play_game(model, n_mcts_sim, device, leaf_batch_size,
+                                                            virtual_loss, root_pool, root_workers)
+    else:
+        trajectory, final_scores = _play_self_play_game(model, n_mcts_sim, device, leaf_batch_size,
+                                                        virtual_loss)
+
+    # final_scores[color] is negative leftover squares
+    # We'll label each (turn) with that player's final score, or a scaled version
+    # For example, we could just store final_scores[color] as is:
+    samples = []
+    for (board_t, piece_t, pi, pl_color) in trajectory:
+        value_target = final_scores[pl_color]  # e.g. - leftover_squares
+        # Could scale it to [-1..1], up to you
+        # Let's keep it as is for now
+        # The encodings were made in inference mode; cloning them out here
+        # gives normal tensors that training can use in autograd.
+        samples.append((board_t.clone(), piece_t.clone(), pi, float(value_target)))
 
+    return samples
+
+@torch.inference_mode()
+def _play_self_play_game(model, n_mcts_sim, device, leaf_batch_size, virtual_loss,
+                         root_pool=None, root_workers=1):
+    """
+    The game loop of run_self_play_game; searches go to root_pool if one is given.
+    Nothing here is ever backpropagated, so it all runs in inference mode.
+    Returns the trajectory of (board_t, piece_t, pi, current_player) and the
+    final scores.
+    """
     # Initialize
     st = BoardState()
     trajectory = []  # list of (board_t, piece_t, pi, current_player)
@@ -32,108 +75,146 @@ def run_self_play_game(model, n_mcts_sim=50, device='cpu'):
 
     while not is_terminal(st):
         # run MCTS from root
-        mcts_search(root, model, n_simulations=n_mcts_sim, c_puct=1.0, device=device)
+        if root_pool is None:
+            mcts_search(root, model, n_simulations=n_mcts_sim, c_puct=1.0, device=device,
+                        batch_size=leaf_batch_size, virtual_loss=virtual_loss)
+        else:
+            # a worker's first simulation only expands its own root, so it needs at
+            # least a second one for any child of the root to get a visit
+            n_worker_sim = max(2, n_mcts_sim // root_workers)
+            jobs = [(st, n_worker_sim, random.getrandbits(32), leaf_batch_size, virtual_loss)
+                    for _ in range(root_workers)]
+            merge_root_statistics(root, root_pool.map(_root_search_worker, jobs))
 
         # gather visit counts for each child => policy distribution
-        # We sum visits for each piece_id (and pass) across placements
-        visits = {}
-        total_visits = 0
-        for action_key, child in root.children.items():
-            # action_key could be (pid, idx) or ('pass', 0)
-            vcount = child.visit_count
-            total_visits += vcount
-            if action_key[0] == 'pass':
-                # accumulate visits to 'pass'
-                visits['pass'] = visits.get('pass', 0) + vcount
-            else:
-                pid = action_key[0]
-                visits[pid] = visits.get(pid, 0) + vcount
+        # We sum visits for each piece_id (and pass, index 21) across placements
+        visit_vec = np.bincount(root.child_actions, weights=root.child_visits, minlength=22).astype(np.int64)
+        total_visits = int(visit_vec.sum())
 
         # Create a 22-dim distribution (21 piece IDs + pass)
-        pi = [0.0]*22
-        for pid in range(21):
-            if pid in visits:
-                pi[pid] = visits[pid] / total_visits
-        pass_idx = 21
-        if 'pass' in visits:
-            pi[pass_idx] = visits['pass'] / total_visits
-
-        # record the training example
-        board_t, piece_t = encode_state(st)
+        if total_visits > 0:
+            pi = visit_vec.astype(np.float32) / total_visits
+            # inverse-CDF sampling straight from the integer visit counts: the first entry
+            # whose cumulative count exceeds a uniform draw in [0, total_visits)
+            # (side='right' so zero-visit entries are never picked)
+            cdf = np.cumsum(visit_vec)
+            draw = np.random.randint(total_visits)
+        else:
+            # no simulation got past the root (too few of them): use the root's priors
+            prior_vec = np.bincount(root.child_actions, weights=root.child_priors, minlength=22)
+            pi = (prior_vec / prior_vec.sum()).astype(np.float32)
+            cdf = np.cumsum(prior_vec)
+            draw = np.random.random() * cdf[-1]
+
+        # record the training example (root's encoding is usually cached from
+        # when it was evaluated as a leaf of the previous search)
+        board_t, piece_t = root.encoded(device)
         current_player = st.current_player
         trajectory.append((board_t, piece_t, pi, current_player))
 
         # pick an action from the visits distribution
         # (some exploration approach: random choice by pi, or argmax)
-        action_index = random.choices(range(22), weights=pi, k=1)[0]
+        action_index = int(np.searchsorted(cdf, draw, side='right'))
         if action_index == 21:
             # pass
             mv = None
         else:
-            # pick a legal placement from the expansions
-            # we must sample among all child nodes with that piece_id
-            # gather children
+            # pick a legal placement from the expansions:
+            # the child slots with that piece_id are kept per piece on the root
             piece_id = action_index
-            valid_children = []
-            for (ak, childnode) in root.children.items():
-                if ak[0] == 'pass':
-                    continue
-                if ak[0] == piece_id:
-                    valid_children.append((ak, childnode))
-            if len(valid_children) == 0:
+            valid_slots = root.child_slots_by_pid.get(piece_id, [])
+            if len(valid_slots) == 0:
                 # forced pass if no actual child
                 mv = None
             else:
                 # pick uniformly among them or pick the most visited
                 # let's pick the child with the highest visit_count
-                best_child = max(valid_children, key=lambda x: x[1].visit_count)
-                ak_best = best_child[0]
-                # We'll reconstruct the actual move by retrieving 
-                # from apply_move in expand_node. 
-                # But we didn't store that; let's do a hack: we can re-get legal moves, find the same index, etc.
-
-                # Actually, simpler approach: we can store the state from best_child as next state.
-                # We'll proceed that way.
-                pass
-            # We already have best_child. So let's define next_state
-            next_node = best_child[1]
-            st = next_node.state
-            root = next_node
-            root.parent = None
-            continue
+                best_slot = max(valid_slots, key=lambda i: root.child_visits[i])
+                # The child already holds its move; its state is built from root's on
+                # first access, which has to happen before it is detached.
+                next_node = root.get_child(best_slot)
+                st = next_node.state
+                root = next_node
+                root.parent = None
+                continue
 
         # If we get here, that means the chosen action is pass or forced pass
-        st = apply_move(st, mv)
         # find the child node for pass
         pass_key = ('pass', 0)
-        if pass_key in root.children:
-            root = root.children[pass_key]
+        if pass_key in root.child_index:
+            root = root.get_child(root.child_index[pass_key])
+            st = root.state
             root.parent = None
         else:
             # no pass child => we create new node
+            st = apply_move(st, mv)
             root = MCTSNode(st)
 
     # terminal
-    final_scores = compute_final_scores(st)
-    # e.g. final_scores[color] is negative leftover squares
-    # We'll label each (turn) with that player's final score, or a scaled version
-    # For example, we could just store final_scores[color] as is:
-    samples = []
-    for (board_t, piece_t, pi, pl_color) in trajectory:
-        value_target = final_scores[pl_color]  # e.g. - leftover_squares
-        # Could scale it to [-1..1], up to you
-        # Let's keep it as is for now
-        samples.append((board_t, piece_t, pi, float(value_target)))
-
-    return samples
+    return trajectory, compute_final_scores(st)
 
-def generate_self_play_data(model, n_games, n_mcts_sim=50, device='cpu'):
+def generate_self_play_data(model, n_games, n_mcts_sim=50, device='cpu', num_workers=1,
+                            leaf_batch_size=8, concurrent_games=1, root_workers=1):
     """
     Runs multiple self-play games, returns a combined list of training samples.
     Each sample: (board_t, piece_t, pi, value_target)
+
+    With num_workers > 1 (CPU only) the games are spread over a pool of
+    worker processes, each holding the model (its parameters in shared memory)
+    and running whole games on its own.
+
+    Otherwise, with concurrent_games > 1, that many games are played at once
+    in threads of this process, and their leaf batches are merged into shared
+    forward passes by an InferenceServer.
+
+    Games played one after another can instead spread each move's search over
+    root_workers processes (see run_self_play_game).
     """
     all_data = []
+    if num_workers > 1 and device == 'cpu':
+        model.share_memory()
+        with mp.Pool(num_workers, initializer=_init_self_play_worker, initargs=(model,)) as pool:
+            game_args = [(n_mcts_sim, leaf_batch_size)] * n_games
+            for game_samples in pool.imap_unordered(_self_play_worker_game, game_args):
+                all_data.extend(game_samples)
+        return all_data
+
+    if concurrent_games > 1:
+        with InferenceServer(model, max_batch=concurrent_games * leaf_batch_size) as server, \
+                ThreadPoolExecutor(max_workers=concurrent_games) as executor:
+            futures = [executor.submit(run_self_play_game, server, n_mcts_sim, device, leaf_batch_size)
+                       for _ in range(n_games)]
+            for future in futures:
+                all_data.extend(future.result())
+        return all_data
+
     for g in range(n_games):
-        game_samples = run_self_play_game(model, n_mcts_sim=n_mcts_sim, device=device)
+        game_samples = run_self_play_game(model, n_mcts_sim=n_mcts_sim, device=device,
+                                          leaf_batch_size=leaf_batch_size, root_workers=root_workers)
         all_data.extend(game_samples)
     return all_data
+
+# Model used by the games of one self-play worker process
+_worker_model = None
+
+def _init_self_play_worker(model):
+    """
+    Pool initializer: keep the model for this worker, use a single intra-op
+    thread (the processes already use the cores) and reseed the RNGs so
+    forked workers don't all play the same game.
+    """
+    global _worker_model
+    _worker_model = model
+    torch.set_num_threads(1)
+    random.seed()
+    np.random.seed()
+
+def _root_search_worker(args):
+    state, n_mcts_sim, seed, leaf_batch_size, virtual_loss = args
+    return search_root_statistics(state, _worker_model, n_simulations=n_mcts_sim, seed=seed,
+                                  device='cpu', batch_size=leaf_batch_size, virtual_loss=virtual_loss)
+
+def _self_play_worker_game(args):
+    n_mcts_sim, leaf_batch_size = args
+    return run_self_play_game(_worker_model, n_mcts_sim=n_mcts_sim, device='cpu',
+                              leaf_batch_size=leaf_batch_size)
@@ -5,7 +5,8 @@ import torch.nn.functional as F
 import torch.optim as optim
 import logging
 from training.self_play import generate_self_play_data
-from training.replay_buffer import ReplayBuffer
+from training.replay_buffer import ReplayBuffer, BatchPrefetcher
+from rl_agents.networks import quantize_for_inference, bf16_autocast, check_model_device
 
 def train_alphablokus(model, 
                       device='cpu',
@@ -15,7 +16,13 @@ def train_alphablokus(model,
                       batch_size=32,
                       train_steps_per_iter=100,
                       replay_buffer_max=50000,
-                      lr=1e-3):
+                      lr=1e-3,
+                      quantize_self_play=False,
+                      self_play_workers=1,
+                      leaf_batch_size=8,
+                      concurrent_games=1,
+                      root_workers=1,
+                      compile_model=False):
     """
     A basic training loop that:
     1) For iteration in [1..total_iterations]:
@@ -25,6 +32,19 @@ def train_alphablokus(model,
        d) Log progress
 
     We use an Adam optimizer. We track policy loss & value loss via logging.
+
+    If quantize_self_play is set (CPU only), self-play runs on an int8 copy of
+    the model calibrated on replay-buffer samples; training stays FP32.
+    self_play_workers > 1 plays the self-play games in that many processes (CPU only).
+    leaf_batch_size is how many MCTS leaves share one network call in self-play.
+    concurrent_games > 1 plays that many self-play games at once in threads sharing
+    one batched inference server.
+    root_workers > 1 searches every self-play move with that many processes (CPU only).
+    compile_model runs the training step through torch.compile (CUDA graphs on GPU),
+    and in-process FP32 self-play through a dynamic-shape compiled copy, since MCTS
+    batch sizes vary.
+    On CUDA the forward passes (training and self-play) run under bf16 autocast;
+    the losses are computed in FP32.
     """
 
     logger = logging.getLogger("AlphaBlokusTrain")
@@ -34,36 +54,58 @@ def train_alphablokus(model,
     optimizer = optim.Adam(model.parameters(), lr=lr)
 
     model.to(device)
+    if torch.device(device).type == 'cuda':
+        # allow TF32 tensor-core matmuls on Ampere and newer
+        torch.set_float32_matmul_precision('high')
+
+    # Compiled wrappers share their parameters with model
+    train_model = model
+    self_play_compiled = None
+    if compile_model:
+        train_model = torch.compile(model, mode="reduce-overhead")
+        if self_play_workers <= 1 and root_workers <= 1:
+            self_play_compiled = torch.compile(model, dynamic=True)
 
     for it in range(1, total_iterations+1):
         logger.info(f"=== Iteration {it} ===")
         # 1) Self-play
+        check_model_device(model, device)
         model.eval()
-        samples = generate_self_play_data(model, n_games=games_per_iteration, 
-                                          n_mcts_sim=n_mcts_sim, device=device)
+        self_play_model = model if self_play_compiled is None else self_play_compiled
+        if quantize_self_play and device == 'cpu' and len(replay_buffer) >= batch_size:
+            calibration = [replay_buffer.sample(batch_size)[:2] for _ in range(8)]
+            self_play_model = quantize_for_inference(model, calibration)
+        samples = generate_self_play_data(self_play_model, n_games=games_per_iteration, 
+                                          n_mcts_sim=n_mcts_sim, device=device,
+                                          num_workers=self_play_workers,
+                                          leaf_batch_size=leaf_batch_size,
+                                          concurrent_games=concurrent_games,
+                                          root_workers=root_workers)
         logger.info(f"Generated {len(samples)} samples from self-play.")
         replay_buffer.push(samples)
 
         # 2) Training
+        check_model_device(model, device)
         model.train()
         if len(replay_buffer) < batch_size:
             logger.info("Not enough samples in buffer to train.")
             continue
 
+        # On CUDA the next batch is sampled into pinned memory and copied on a side
+        # stream while the current one trains (see BatchPrefetcher)
+        prefetcher = BatchPrefetcher(replay_buffer, batch_size, device)
         for step in range(train_steps_per_iter):
-            board_batch, piece_batch, pi_batch, value_batch = replay_buffer.sample(batch_size)
-            board_batch = board_batch.to(device)
-            piece_batch = piece_batch.to(device)
-            pi_batch = pi_batch.to(device)
-            value_batch = value_batch.to(device)
+            board_batch, piece_batch, pi_batch, value_batch = prefetcher.next()
 
             optimizer.zero_grad()
-            policy_logits, value_pred = model(board_batch, piece_batch)
+            with bf16_autocast(device):
+                policy_logits, value_pred = train_model(board_batch, piece_batch)
+            policy_logits, value_pred = policy_logits.float(), value_pred.float()
 
             # policy loss (cross-entropy with pi_batch)
-            # We use F.log_softmax for stability
-            log_probs = F.log_softmax(policy_logits, dim=1)
-            policy_loss = -torch.sum(pi_batch * log_probs, dim=1).mean()
+            # F.cross_entropy takes the visit distribution directly as soft targets
+            # (same as -(pi_batch * log_softmax(policy_logits)).sum(1).mean())
+            policy_loss = F.cross_entropy(policy_logits, pi_batch)
 
             # value loss (MSE or huber)
             # We have value_batch as is (like - leftover squares).
@@ -77,5 +119,8 @@ def train_alphablokus(model,
 
         # Log some info
         logger.info(f"Completed training steps. Policy loss={policy_loss.item():.4f}, value_loss={value_loss.item():.4f}")
+        if torch.device(device).type == 'cuda':
+            # a steadily growing figure here points at copies of the model or batches piling up
+            logger.info(f"CUDA memory allocated: {torch.cuda.memory_allocated(device) / 2**20:.1f} MiB")
 
     logger.info("Training loop finished.")
@@ -4,24 +4,29 @@ console_render.py
 Renders the board in ASCII so we can observe the game state in the console.
 """
 
-from game_engine.board import BOARD_SIZE
+import numpy as np
+from game_engine.board import BOARD_SIZE, EMPTY
 
 COLOR_CHARS = ['R','B','Y','G']  # Red, Blue, Yellow, Green
 
+# Character for every possible uint8 cell value: '.' for EMPTY, R/B/Y/G for colors 0..3
+CELL_CHARS = np.full(256, '?', dtype='<U1')
+CELL_CHARS[EMPTY] = '.'
+CELL_CHARS[:len(COLOR_CHARS)] = COLOR_CHARS
+
+# Column header, the same for every frame
+HEADER = "   " + "".join([f"{c%10}" for c in range(BOARD_SIZE)])
+
 def print_board(board_grid):
     """
     Print the 20x20 board. Each cell is either '.' if empty or R/B/Y/G if occupied.
-    board_grid[r][c] is either None or 0..3
+    board_grid[r, c] is either EMPTY or 0..3
+    The whole grid is mapped to characters with one CELL_CHARS lookup and
+    printed as a single string.
     """
-    print("   " + "".join([f"{c%10}" for c in range(BOARD_SIZE)]))
+    chars = CELL_CHARS[board_grid]
+    lines = [HEADER]
     for r in range(BOARD_SIZE):
-        row_str = []
-        for c in range(BOARD_SIZE):
-            occupant = board_grid[r][c]
-            if occupant is None:
-                row_str.append('.')
-            else:
-                row_str.append(COLOR_CHARS[occupant])
-        # Print row index + row
-        print(f"{r%10:2d} " + "".join(row_str))
-    print()
+        # row index + row
+        lines.append(f"{r%10:2d} " + "".join(chars[r].tolist()))
+    print("\n".join(lines) + "\n")
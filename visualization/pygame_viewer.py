@@ -14,8 +14,9 @@ Usage:
 
 import pygame
 import sys
+import numpy as np
 from typing import List
-from game_engine.board import BoardState, BOARD_SIZE
+from game_engine.board import BoardState, BOARD_SIZE, EMPTY, piece_ids
 from game_engine.scoring import compute_final_scores
 from game_engine.pieces import ALL_SHAPES
 
@@ -25,15 +26,21 @@ CELL_SIZE = 20
 # Side panel width (in pixels)
 SIDE_PANEL_WIDTH = 300
 
-# Color mapping for each occupant on the board (0=Red, 1=Blue, 2=Yellow, 3=Green, None=White)
+# Color mapping for each occupant on the board (0=Red, 1=Blue, 2=Yellow, 3=Green, EMPTY=White)
 COLOR_FOR_OCCUPANT = {
     0: (255, 0, 0),       # Red
     1: (0, 0, 255),       # Blue
     2: (255, 255, 0),     # Yellow
     3: (0, 200, 0),       # Green
-    None: (255, 255, 255) # Empty
+    EMPTY: (255, 255, 255) # Empty
 }
 
+# The same colors as an RGB lookup table indexed by the uint8 cell value
+OCCUPANT_RGB = np.zeros((256, 3), dtype=np.uint8)
+for _occupant, _rgb in COLOR_FOR_OCCUPANT.items():
+    OCCUPANT_RGB[_occupant] = _rgb
+del _occupant, _rgb
+
 # Basic background color for the entire window
 BG_COLOR = (40, 40, 40)
 
@@ -41,6 +48,23 @@ BG_COLOR = (40, 40, 40)
 COLOR_NAMES = ["Red", "Blue", "Yellow", "Green"]
 
 
+# Transparent surface holding just the grid lines, drawn once on first use
+_grid_overlay = None
+
+def get_grid_overlay() -> pygame.Surface:
+    """
+    The cell outlines of the board as a transparent overlay, built on first call.
+    """
+    global _grid_overlay
+    if _grid_overlay is None:
+        _grid_overlay = pygame.Surface((BOARD_SIZE * CELL_SIZE, BOARD_SIZE * CELL_SIZE), pygame.SRCALPHA)
+        for r in range(BOARD_SIZE):
+            for c in range(BOARD_SIZE):
+                rect = pygame.Rect(c * CELL_SIZE, r * CELL_SIZE, CELL_SIZE, CELL_SIZE)
+                pygame.draw.rect(_grid_overlay, (0, 0, 0), rect, 1)
+    return _grid_overlay
+
+
 def draw_board(screen: pygame.Surface,
                board: BoardState,
                font: pygame.font.Font,
@@ -54,14 +78,13 @@ def draw_board(screen: pygame.Surface,
     screen.fill(BG_COLOR)
 
     # --- Draw the board grid on the left side ---
-    for r in range(BOARD_SIZE):
-        for c in range(BOARD_SIZE):
-            occupant = board.board_grid[r][c]
-            color = COLOR_FOR_OCCUPANT[occupant]
-            rect = pygame.Rect(c * CELL_SIZE, r * CELL_SIZE, CELL_SIZE, CELL_SIZE)
-            pygame.draw.rect(screen, color, rect)
-            # Grid line (optional)
-            pygame.draw.rect(screen, (0, 0, 0), rect, 1)
+    # One pixel per cell (surfarray is indexed [x, y], hence the swap), scaled up
+    # to CELL_SIZE pixels per cell, then the cached grid lines on top
+    rgb = OCCUPANT_RGB[board.board_grid]
+    cells = pygame.surfarray.make_surface(rgb.swapaxes(0, 1))
+    board_px = BOARD_SIZE * CELL_SIZE
+    screen.blit(pygame.transform.scale(cells, (board_px, board_px)), (0, 0))
+    screen.blit(get_grid_overlay(), (0, 0))
 
     # Turn label on top-left
     label_surface = font.render(f"Turn {turn_index+1}/{total_turns}", True, (255, 255, 255))
@@ -102,7 +125,7 @@ def draw_side_panel(screen: pygame.Surface,
         # partial score
         color_score = partial_scores[color]
         # how many pieces left
-        pieces_left = board.pieces_remaining[color]
+        pieces_left = piece_ids(board.pieces_remaining[color])
 
         # First line: e.g. "Red: score X"
         color_info_surf = font.render(
@@ -209,14 +232,14 @@ def test_pygame_viewer():
             rr = random.randint(0, BOARD_SIZE-1)
             cc = random.randint(0, BOARD_SIZE-1)
             color = random.randint(0,3)
-            bs.board_grid[rr][cc] = color
+            bs.board_grid[rr, cc] = color
         # Randomly remove some pieces
         for color in range(4):
             remove_count = random.randint(0, 3)
             for _ in range(remove_count):
-                if len(bs.pieces_remaining[color]) > 0:
-                    any_piece = random.choice(list(bs.pieces_remaining[color]))
-                    bs.pieces_remaining[color].remove(any_piece)
+                if bs.pieces_remaining[color]:
+                    any_piece = random.choice(piece_ids(bs.pieces_remaining[color]))
+                    bs.pieces_remaining[color] &= ~(1 << any_piece)
         states.append(bs)
 
     replay_game(states)